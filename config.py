@@ -9,3 +9,10 @@ pipeline_desc = "videotestsrc ! video/x-raw, format=(string)YUY2, width=(int)320
 ignore_list = ['parent']
 
 display_preview = True
+
+# delivery limits per event type, see gstgengui.event.Manager.set_event_policy
+event_policies = {
+    # at most 10 level events per second, the latest one being delivered at the end of each interval
+    'level': {'max_rate': 10, 'coalesce': True},
+    'gst_element_message': {'max_rate': 50},
+}
@@ -10,5 +10,17 @@ Render local readme files before sending off to Github.
 
 __version__ = '1.2.0'
 
-from . import gtk_controller, gstintrospector, gstmanager, event
+import importlib
 
+from . import startup
+startup.extend_typelib_path()
+
+# submodules are imported on first access, so that importing the package loads
+# neither GStreamer nor GTK (e.g. for headless use or --help)
+_submodules = ('gstintrospector', 'gstmanager', 'event', 'gtk_controller')
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
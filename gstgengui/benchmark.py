@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# * This Program is free software; you can redistribute it and/or
+# * modify it under the terms of the GNU Lesser General Public
+# * License as published by the Free Software Foundation; either
+# * version 2.1 of the License, or (at your option) any later version.
+# *
+# * Libav is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# * Lesser General Public License for more details.
+# *
+# * You should have received a copy of the GNU Lesser General Public
+# * License along with Libav; if not, write to the Free Software
+# * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Gst-gengui: pipeline benchmark runner
+
+Runs a pipeline description several times (after warmup runs) and measures
+parse time, time to PAUSED, time to PLAYING, buffers/s and frames/s at the
+sinks, wall time to EOS, and process CPU time and RSS. Results are written
+as JSON and can be compared against a previous result file, failing when a
+metric regressed by more than the tolerance.
+
+Copyright 2013, Dirk Van Haerenborgh, under the terms of LGPL
+
+"""
+__author__ = ("Florent Thiery <fthiery@gmail.com>", "Dirk Van Haerenborgh <vhdirk@gmail.com>")
+
+import sys
+import json
+import time
+import resource
+import statistics
+import collections
+import logging
+logger = logging.getLogger('benchmark')
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib, Gst
+
+from .gstmanager import PipelineManager, easyevent
+
+# metric name -> True if higher is better
+METRICS = collections.OrderedDict([
+    ("parse_time", False),
+    ("time_to_paused", False),
+    ("time_to_playing", False),
+    ("time_to_eos", False),
+    ("buffers_per_second", True),
+    ("frames_per_second", True),
+    ("cpu_time", False),
+    ("max_rss_kb", False),
+])
+
+
+class BenchmarkRunner(easyevent.Listener):
+    def __init__(self, description, duration=None, timeout=60):
+        """
+        duration: seconds of playback after which EOS is sent, for endless sources
+        timeout: seconds after which an iteration is aborted
+        """
+        easyevent.Listener.__init__(self)
+        self.description = description
+        self.duration = duration
+        self.timeout = timeout
+        self.register_event('eos', 'gst_error')
+        self.manager = None
+        self.loop = None
+
+    def evt_eos(self, event):
+        if event.source is self.manager and self.result.get("time_to_eos") is None:
+            self.result["time_to_eos"] = time.perf_counter() - self.playing_at
+            self.loop.quit()
+
+    def evt_gst_error(self, event):
+        if event.source is self.manager:
+            self.result["error"] = event.content
+            self.loop.quit()
+
+    def _count_buffer(self, pad, info, counters):
+        counters[0] += 1
+        return Gst.PadProbeReturn.OK
+
+    def _install_counters(self, pipeline):
+        buffers = [0]
+        frames = [0]
+        iterator = pipeline.iterate_sinks()
+        while True:
+            result, sink = iterator.next()
+            if result != Gst.IteratorResult.OK:
+                break
+            for pad in sink.sinkpads:
+                pad.add_probe(Gst.PadProbeType.BUFFER, self._count_buffer, buffers)
+                pad.add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, self._on_sink_event, frames)
+        return buffers, frames
+
+    def _on_sink_event(self, pad, info, frames):
+        # buffers reaching sinks negotiated with video caps are counted as frames
+        event = info.get_event()
+        if event.type == Gst.EventType.CAPS and event.parse_caps().get_structure(0).get_name().startswith("video/"):
+            pad.add_probe(Gst.PadProbeType.BUFFER, self._count_buffer, frames)
+            return Gst.PadProbeReturn.REMOVE
+        return Gst.PadProbeReturn.OK
+
+    def _on_state(self, state, name):
+        if state is None:
+            self.result["error"] = "timeout waiting for {0}".format(name)
+            self.loop.quit()
+            return
+        self.result["time_to_{0}".format(name)] = time.perf_counter() - self.state_requested_at
+        self.loop.quit()
+
+    def _wait_for_state(self, state, name):
+        self.state_requested_at = time.perf_counter()
+        self.manager.wait_for_state(state, lambda reached: self._on_state(reached, name), self.timeout * 1000)
+        self.manager.set_state(state)
+        if self.result.get("time_to_{0}".format(name)) is None and "error" not in self.result:
+            self.loop.run()
+        return "error" not in self.result
+
+    def _on_timeout(self):
+        self._source_ids.remove(self._timeout_id)
+        self.result["error"] = "timeout waiting for EOS"
+        self.loop.quit()
+        return False
+
+    def _on_duration(self):
+        self._source_ids.remove(self._duration_id)
+        self.manager.send_eos()
+        return False
+
+    def run_iteration(self):
+        self.result = result = {}
+        self.loop = GLib.MainLoop()
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        started = time.perf_counter()
+        self.manager = PipelineManager(self.description)
+        result["parse_time"] = time.perf_counter() - started
+        if not hasattr(self.manager, 'pipeline'):
+            result.setdefault("error", "could not parse pipeline")
+            self.manager.close()
+            return result
+        buffers, frames = self._install_counters(self.manager.pipeline)
+        if self._wait_for_state(Gst.State.PAUSED, "paused") and self._wait_for_state(Gst.State.PLAYING, "playing"):
+            self.playing_at = time.perf_counter()
+            buffers[0] = frames[0] = 0
+            self._timeout_id = GLib.timeout_add_seconds(self.timeout, self._on_timeout)
+            self._source_ids = [self._timeout_id]
+            if self.duration is not None:
+                self._duration_id = GLib.timeout_add(int(self.duration * 1000), self._on_duration)
+                self._source_ids.append(self._duration_id)
+            if result.get("time_to_eos") is None and "error" not in result:
+                self.loop.run()
+            for source_id in self._source_ids:
+                GLib.source_remove(source_id)
+            played = time.perf_counter() - self.playing_at
+            result["buffers_per_second"] = buffers[0] / played if played else 0
+            result["frames_per_second"] = frames[0] / played if played else 0
+        self.manager.close()
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+        result["cpu_time"] = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+        result["max_rss_kb"] = usage_after.ru_maxrss
+        return result
+
+    def run(self, iterations=5, warmup=1):
+        for i in range(warmup):
+            logger.info("Warmup run {0}/{1}".format(i + 1, warmup))
+            self.run_iteration()
+        runs = []
+        for i in range(iterations):
+            result = self.run_iteration()
+            logger.info("Run {0}/{1}: {2}".format(i + 1, iterations, result))
+            runs.append(result)
+        return {
+            "description": self.description,
+            "gstreamer": Gst.version_string(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "iterations": iterations,
+            "warmup": warmup,
+            "failures": sum(1 for run in runs if "error" in run),
+            "summary": summarize(runs),
+            "runs": runs,
+        }
+
+
+def summarize(runs):
+    summary = {}
+    for metric in METRICS:
+        values = [run[metric] for run in runs if run.get(metric) is not None and "error" not in run]
+        if values:
+            summary[metric] = {
+                "median": statistics.median(values),
+                "mean": statistics.mean(values),
+                "min": min(values),
+                "max": max(values),
+                "stdev": statistics.stdev(values) if len(values) > 1 else 0.0,
+            }
+    return summary
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Compares the medians of results with a baseline result
+    Returns the comparison rows and whether any metric regressed by more than tolerance
+    """
+    rows = []
+    regressed = False
+    for metric, higher_is_better in METRICS.items():
+        if metric not in results["summary"] or metric not in baseline["summary"]:
+            continue
+        value = results["summary"][metric]["median"]
+        reference = baseline["summary"][metric]["median"]
+        change = (value - reference) / reference if reference else 0.0
+        worse = -change if higher_is_better else change
+        metric_regressed = worse > tolerance
+        regressed = regressed or metric_regressed
+        rows.append({"metric": metric, "baseline": reference, "value": value, "change": change, "regressed": metric_regressed})
+    return rows, regressed
+
+
+def main():
+    from .gstgengui import init, parse_args
+
+    import argparse
+    parser = argparse.ArgumentParser(prog="gstgengui-benchmark", description='benchmarking GStreamer pipeline descriptions', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-v', "--verbose", action="store_true", dest="verbose", default=False, help="Use DEBUG verbosity level")
+    parser.add_argument('-c', "--config", dest="config", help="Loads pipeline_desc from the given configuration file")
+    parser.add_argument('-n', "--iterations", dest="iterations", type=int, default=5, help="Number of measured runs")
+    parser.add_argument('-w', "--warmup", dest="warmup", type=int, default=1, help="Number of runs before measuring")
+    parser.add_argument('-d', "--duration", dest="duration", type=float, help="Send EOS after the given number of seconds of playback, for endless sources")
+    parser.add_argument("--timeout", dest="timeout", type=int, default=60, help="Abort a run after the given number of seconds")
+    parser.add_argument('-o', "--output", dest="output", help="Write the JSON results to the given file instead of stdout")
+    parser.add_argument('-b', "--baseline", dest="baseline", help="Compare the results with the given JSON results file")
+    parser.add_argument("--tolerance", dest="tolerance", type=float, default=0.1, help="Relative regression allowed before failing the comparison")
+    parser.add_argument('pipeline', nargs='*', help='Pipeline description')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+        format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s',
+        stream=sys.stderr
+    )
+
+    configuration = {'pipeline_desc': None}
+    if args.config:
+        with open(args.config) as config:
+            exec(config.read(), {}, configuration)
+    if args.pipeline:
+        configuration['pipeline_desc'] = parse_args(args.pipeline)
+    if not configuration['pipeline_desc']:
+        logger.error("Empty pipeline unauthorized, quitting")
+        sys.exit(1)
+
+    init()
+    results = BenchmarkRunner(configuration['pipeline_desc'], args.duration, args.timeout).run(args.iterations, args.warmup)
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        results["comparison"], regressed = compare(results, baseline, args.tolerance)
+        for row in results["comparison"]:
+            sys.stderr.write("{0:<20} {1:>12.4f} {2:>12.4f} {3:>+8.1%}{4}\n".format(row["metric"], row["baseline"], row["value"], row["change"], "  REGRESSION" if row["regressed"] else ""))
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    sys.exit(1 if regressed or results["failures"] else 0)
+
+if __name__ == '__main__':
+    main()
@@ -10,13 +10,30 @@ Module to do event-driven programming very easily.
 Module attributes:
 
  - dispatcher: accepted values:
-   'gobject' (asynchronous),
+   'glib' (asynchronous, events are queued and drained in batches from the GLib main context),
+   'gobject' (alias of 'glib'),
    'callback' (synchronous).
+ - batch_size: maximum number of queued events delivered per main loop iteration in 'glib' mode.
+ - batch_time: time budget in seconds of one main loop iteration in 'glib' mode.
+ - pool_workers: number of threads running the handlers of threaded listeners (see C{L{Listener}}).
+ - fast_path: if C{True}, launching an event type without listeners returns before building the C{L{Event}}.
 """
 
+import bisect
+import collections
+import functools
+import json
+import os
+import threading
+import time
+import weakref
 import logging
 logger = logging.getLogger('event')
 dispatcher = 'callback'
+batch_size = 100
+batch_time = 0.01
+pool_workers = 4
+fast_path = True
 
 log_ignores = ["level"]
 
@@ -26,36 +43,79 @@ class Manager(object):
     so it is not needed to use it directly but via Launch and Listener.
     @cvar instance: The instance created on importing the module.
     @type instance: C{L{Manager}}
-    @ivar listeners: Dictionnary with keys of type C{str} representing a event type and with values of type C{list} representing a collection of C{EventListener}.
-    @type listeners: C{dict<str, list<L{Listener}>>}
+    @ivar listeners: Dictionnary with keys of type C{str} representing a event type and with values of type C{dict} mapping a weak reference to each C{EventListener} to its handler, in registration order.
+    @type listeners: C{dict<str, dict<weakref<L{Listener}>, callable>>}
+    @ivar events_by_listener: Reverse index of C{listeners}: event types listened by each listener.
+    @type events_by_listener: C{dict<weakref<L{Listener}>, set<str>>}
+    @ivar dispatch_table: Listeners and handlers to call for each event type, in registration order. Handlers are called with the listener and the event.
+    @type dispatch_table: C{dict<str, list<(weakref<L{Listener}>, callable)>>}
+    @ivar pending: Events waiting to be delivered in 'glib' mode, with their handlers.
+    @type pending: C{deque<[L{Event}, list, L{EventPolicy}, key]>}
+    @ivar policies: Delivery policy of each limited event type.
+    @type policies: C{dict<str, L{EventPolicy}>}
+    @ivar threaded_listeners: Listeners whose handlers run on the thread pool.
+    @type threaded_listeners: C{WeakSet<L{Listener}>}
+    @ivar instrumentation: Event statistics, if enabled with C{L{enable_instrumentation}}.
+    @type instrumentation: C{L{Instrumentation}}
+
+    Listeners are only weakly referenced: a listener which is garbage collected is unregistered from all its events.
+    As weak reference callbacks run on whichever thread collects the listener, registry changes are made under a lock.
     """
     def __init__(self):
         """ Manager constructor. """
         if not hasattr(Manager, 'instance'):
             Manager.instance = self
         self.listeners = {}
+        self.events_by_listener = {}
+        self.dispatch_table = {}
+        self._listener_refs = {}
+        self._listener_classes = {}
+        self._class_counts = collections.Counter()
+        self.pending = collections.deque()
+        self.policies = {}
+        self._drain_lock = threading.Lock()
+        self._drain_source = None
+        self.threaded_listeners = weakref.WeakSet()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._queue_lock = threading.Lock()
+        # reentrant, as a listener may be collected while the registry is being changed
+        self._registry_lock = threading.RLock()
+        self.instrumentation = None
         
     def add_listener(self, obj, event_type):
         """ Add a listener to a specific event.
+        Adding an already registered listener again resolves its handler again.
         @param obj: Listener to add.
         @type obj: C{L{Listener}}
         @param event_type: Type of the event to listen.
         @type event_type: C{str}
         """
-        if event_type in self.listeners:
-            if obj not in self.listeners[event_type]:
-                self.listeners[event_type].append(obj)          
-            class_name = obj.__class__
-            i = 0
-            duplicate_objects = list()
-            for listener in self.listeners[event_type]:
-                if listener.__class__ == class_name and listener != obj:
-                    duplicate_objects.append(listener)
-                    i += 1
-            if i > 0:
-                logger.warning('Warning, multiple class registration detected (%s times) for class %s for event %s, objects: old %s and new %s', i, class_name, event_type, duplicate_objects, obj)
-        else:
-            self.listeners[event_type] = [obj]
+        handler = obj.resolve_handler(event_type)
+        if handler is not None:
+            if getattr(handler, '__self__', None) is obj:
+                handler = handler.__func__
+            else:
+                handler = functools.partial(_call_unbound, handler)
+            if obj.event_threaded:
+                self.threaded_listeners.add(obj)
+        with self._registry_lock:
+            ref = self._listener_refs.get(weakref.ref(obj))
+            if ref is None:
+                ref = weakref.ref(obj, self._listener_collected)
+                self._listener_refs[ref] = ref
+                self._listener_classes[ref] = obj.__class__
+                self.events_by_listener[ref] = set()
+            events = self.events_by_listener[ref]
+            listeners = self.listeners.setdefault(event_type, {})
+            if event_type not in events:
+                events.add(event_type)
+                key = (event_type, obj.__class__)
+                self._class_counts[key] += 1
+                if self._class_counts[key] > 1:
+                    logger.warning('Warning, multiple class registration detected (%s times) for class %s for event %s, new object %s', self._class_counts[key] - 1, obj.__class__, event_type, obj)
+            listeners[ref] = handler
+            self._update_dispatch_table(event_type)
     
     def remove_listener(self, obj, event_type):
         """ Remove a listener from a specific event.
@@ -64,54 +124,486 @@ class Manager(object):
         @param event_type: Type of the event that was listening.
         @type event_type: C{str}
         """
-        if event_type in self.listeners and obj in self.listeners[event_type]:
-            self.listeners[event_type].remove(obj)
+        self._remove(weakref.ref(obj), event_type)
+
+    def _remove(self, ref, event_type):
+        with self._registry_lock:
+            events = self.events_by_listener.get(ref)
+            if events is None or event_type not in events:
+                return
+            ref = self._listener_refs[ref]
+            key = (event_type, self._listener_classes[ref])
+            events.discard(event_type)
+            if not events:
+                del self.events_by_listener[ref]
+                del self._listener_refs[ref]
+                del self._listener_classes[ref]
+            del self.listeners[event_type][ref]
+            if not self.listeners[event_type]:
+                del self.listeners[event_type]
+            self._class_counts[key] -= 1
+            if not self._class_counts[key]:
+                del self._class_counts[key]
+            self._update_dispatch_table(event_type)
+
+    def _listener_collected(self, ref):
+        """ Unregisters a garbage collected listener from all its events. """
+        with self._registry_lock:
+            for event_type in list(self.events_by_listener.get(ref, ())):
+                self._remove(ref, event_type)
+
+    def _update_dispatch_table(self, event_type):
+        """ Rebuilds the list of handlers called when dispatching an event type.
+        The list is replaced rather than modified in place, so that an event being dispatched is not affected by listeners (un)registering from their handlers.
+        Called with the registry lock held.
+        @param event_type: Type of the event to update.
+        @type event_type: C{str}
+        """
+        handlers = []
+        for ref, function in list(self.listeners.get(event_type, {}).items()):
+            obj = ref()
+            if function is None or obj is None:
+                continue
+            if self.instrumentation is not None:
+                function = self.instrumentation.wrap(event_type, function)
+            if obj.event_threaded:
+                function = functools.partial(self._submit, function)
+            handlers.append((ref, function))
+        if handlers:
+            self.dispatch_table[event_type] = handlers
+        else:
+            self.dispatch_table.pop(event_type, None)
     
+    def enable_instrumentation(self, budget=0.01):
+        """ Starts counting events and timing handlers, see C{L{Instrumentation}}.
+        @param budget: Handler duration in seconds above which a warning is logged.
+        @type budget: C{float}
+        @rtype: C{L{Instrumentation}}
+        """
+        self.instrumentation = Instrumentation(budget)
+        with self._registry_lock:
+            for event_type in list(self.listeners):
+                self._update_dispatch_table(event_type)
+        return self.instrumentation
+
+    def disable_instrumentation(self):
+        """ Stops counting events and timing handlers. """
+        if self.instrumentation is not None:
+            self.instrumentation.stop_dump()
+            self.instrumentation = None
+            with self._registry_lock:
+                for event_type in list(self.listeners):
+                    self._update_dispatch_table(event_type)
+
     def get_events_listened_by(self, obj):
-        result = list()
-        for type, listeners in self.listeners.iteritems():
-            if obj in listeners:
-                result.append(type)
-        return result
+        """ Returns the event types a listener is registered to.
+        @param obj: Listener.
+        @type obj: C{L{Listener}}
+        @rtype: C{list<str>}
+        """
+        with self._registry_lock:
+            return list(self.events_by_listener.get(weakref.ref(obj), ()))
     
+    def set_event_policy(self, event_type, max_rate=None, coalesce=False, max_queued=None):
+        """ Limits the delivery of an event type, see C{L{EventPolicy}}.
+        @param event_type: Type of the event to limit.
+        @type event_type: C{str}
+        @return: The policy, also holding the count of dropped events.
+        @rtype: C{L{EventPolicy}}
+        """
+        policy = EventPolicy(max_rate, coalesce, max_queued)
+        self.policies[event_type] = policy
+        return policy
+
+    def remove_event_policy(self, event_type):
+        """ Removes the delivery policy of an event type.
+        @param event_type: Type of the event.
+        @type event_type: C{str}
+        """
+        self.policies.pop(event_type, None)
+
     def dispatch_event(self, event):
         """ Dispatch a launched event to all affected listeners.
+        Handlers are looked up in the dispatch table filled at registration time, see C{L{Listener.resolve_handler}}.
         @param event: Event launched.
         @type event: C{L{Event}}
         """
-        if event.type in self.listeners and self.listeners[event.type]:
-            for obj in self.listeners[event.type]:
-                # Try to call event-specific handle method
-                fctname = obj.event_pattern.format(event.type)
-                if hasattr(obj, fctname):
-                    function = getattr(obj, fctname)
-                    if callable(function):
-                        if dispatcher == 'gobject':
-                            import gobject
-                            gobject.idle_add(function, event)
-                        elif dispatcher == 'callback':
-                            function(event)
-                        continue
-                    else:
-                        logger.warning('Event-specific handler found but not callable.')
-                # Try to call default handle method
-                if hasattr(obj, obj.event_default):
-                    function = getattr(obj, obj.event_default)
-                    if callable(function):
-                        if dispatcher == 'gobject':
-                            import gobject
-                            gobject.idle_add(function, event)
-                        elif dispatcher == 'callback':
-                            function(event)
-                        continue
-                # No handle method found, raise error ?
-                if not obj.event_silent:
-                    raise UnhandledEventError('{0} has no method to handle {1}'.format(obj, event))
-        else:
-            pass#logger.warning('No listener for the event type %r.', event.type)
+        handlers = self.dispatch_table.get(event.type)
+        if handlers is None:
+            return#logger.warning('No listener for the event type %r.', event.type)
+        policy = self.policies.get(event.type)
+        if dispatcher == 'callback':
+            if policy is not None and policy.coalesce and policy.min_interval:
+                self._dispatch_coalesced(event, handlers, policy)
+                return
+            if policy is not None and not policy.admit():
+                return
+            for ref, function in handlers:
+                obj = ref()
+                if obj is not None:
+                    function(obj, event)
+        elif dispatcher in ('glib', 'gobject'):
+            entry = [event, handlers, policy, None]
+            with self._drain_lock:
+                if policy is not None and not policy.enqueue(entry):
+                    return
+                self.pending.append(entry)
+                if self._drain_source is None:
+                    from gi.repository import GLib
+                    self._drain_source = GLib.idle_add(self._drain_pending)
+
+    def _dispatch_coalesced(self, event, handlers, policy):
+        """ Rate limited delivery of coalesced events for the 'callback' dispatcher.
+        Events over the rate limit replace the deferred event of the same key, deferred events being delivered from a timer thread at the end of the interval, so that the latest value is not lost.
+        """
+        with self._drain_lock:
+            delay = policy.get_delay()
+            if policy.timer is None and not delay:
+                policy.last_delivery = time.monotonic()
+            else:
+                key = policy.get_key(event)
+                if key in policy.deferred:
+                    policy.dropped += 1
+                policy.deferred[key] = (event, handlers)
+                if policy.timer is None:
+                    policy.timer = threading.Timer(delay, self._deliver_deferred, (policy,))
+                    policy.timer.daemon = True
+                    policy.timer.start()
+                return
+        self._deliver(event, handlers)
+
+    def _deliver_deferred(self, policy):
+        with self._drain_lock:
+            deferred, policy.deferred = policy.deferred, {}
+            policy.timer = None
+            policy.last_delivery = time.monotonic()
+        for event, handlers in deferred.values():
+            self._deliver(event, handlers)
+
+    def _pop_pending(self):
+        with self._drain_lock:
+            event, handlers, policy, key = self.pending.popleft()
+            if policy is not None:
+                policy.dequeue(key)
+        return event, handlers
+
+    def _drain_pending(self):
+        """ Delivers queued events from the main context, until C{batch_size} events are delivered or C{batch_time} is elapsed.
+        @return: C{True} while events are still queued, so that the idle source is kept.
+        @rtype: C{bool}
+        """
+        deadline = time.monotonic() + batch_time
+        for i in range(batch_size):
+            if not self.pending:
+                break
+            self._deliver(*self._pop_pending())
+            if time.monotonic() >= deadline:
+                break
+        with self._drain_lock:
+            if self.pending:
+                return True
+            self._drain_source = None
+            return False
+
+    def _deliver(self, event, handlers):
+        for ref, function in handlers:
+            obj = ref()
+            if obj is None:
+                continue
+            try:
+                function(obj, event)
+            except Exception:
+                logger.exception('Error while handling {0}'.format(event))
+
+    def _submit(self, function, obj, event):
+        """ Queues an event for a threaded listener.
+        Each listener has at most one task on the pool at a time, so its events are handled in order.
+        """
+        with self._queue_lock:
+            obj.event_queue.append((function, event))
+            if obj.event_queue_busy:
+                return
+            obj.event_queue_busy = True
+        try:
+            self._get_executor().submit(self._run_listener_queue, weakref.ref(obj))
+        except RuntimeError:
+            # the pool is shutting down, the events are handled in this thread rather than lost
+            self._run_listener_queue(weakref.ref(obj))
+
+    def _run_listener_queue(self, ref):
+        while True:
+            obj = ref()
+            if obj is None:
+                return
+            with self._queue_lock:
+                function, event = obj.event_queue.popleft()
+            try:
+                function(obj, event)
+            except Exception:
+                logger.exception('Error while handling {0}'.format(event))
+            with self._queue_lock:
+                if not obj.event_queue:
+                    obj.event_queue_busy = False
+                    return
+            obj = None
+            try:
+                # resubmit rather than loop, so that a busy listener does not hold a worker
+                self._get_executor().submit(self._run_listener_queue, ref)
+                return
+            except RuntimeError:
+                # the pool is shutting down: handle the remaining events before it stops
+                continue
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=pool_workers, thread_name_prefix='event')
+            return self._executor
+
+    def get_queue_depths(self):
+        """ Returns the number of events waiting to be handled by each threaded listener.
+        @rtype: C{dict<L{Listener}, int>}
+        """
+        return dict((obj, len(obj.event_queue)) for obj in self.threaded_listeners)
+
+    def shutdown_pool(self, wait=True):
+        """ Stops the thread pool of threaded listeners.
+        @param wait: Wait for queued events to be handled.
+        @type wait: C{bool}
+        """
+        with self._executor_lock:
+            executor = self._executor
+        if executor is None:
+            return
+        # running tasks handle the rest of their listener queue, as they cannot resubmit
+        executor.shutdown(wait=wait)
+        with self._executor_lock:
+            if self._executor is executor:
+                self._executor = None
+
+    def flush(self):
+        """ Synchronously delivers all events queued in 'glib' mode, e.g. before quitting the main loop. """
+        while self.pending:
+            self._deliver(*self._pop_pending())
 
 Manager()
+
+
+def _call_unbound(function, obj, event):
+    """ Calls a handler which is not a method of its listener, with the dispatch table signature. """
+    function(event)
+
+
+class EventPolicy(object):
+    """ Delivery policy of an event type, set with C{L{Manager.set_event_policy}}.
+    Events which do not match the policy are dropped and counted.
+    The rate limit applies to all dispatchers, the queue limit only to the events queued by the 'glib' dispatcher.
+    With the 'callback' dispatcher, coalescing only applies along with a rate limit: events over the limit are not dropped but replace the deferred event of the same key, which is delivered at the end of the interval.
+    @ivar min_interval: Minimum time in seconds between two deliveries (C{0} if not limited).
+    @type min_interval: C{float}
+    @ivar coalesce: Coalescing flag. If C{True}, an event replaces the queued (or deferred) event of the same type and source, so only the latest value is delivered.
+    @type coalesce: C{bool}
+    @ivar max_queued: Maximum number of queued events of this type (C{None} if not limited).
+    @type max_queued: C{int}
+    @ivar dropped: Number of dropped events.
+    @type dropped: C{int}
+    """
+    def __init__(self, max_rate=None, coalesce=False, max_queued=None):
+        """ EventPolicy constructor.
+        @param max_rate: Maximum number of events delivered per second (Optional).
+        @type max_rate: C{float}
+        @param coalesce: Coalescing flag.
+        @type coalesce: C{bool}
+        @param max_queued: Maximum number of queued events (Optional).
+        @type max_queued: C{int}
+        """
+        self.min_interval = 1.0 / max_rate if max_rate else 0
+        self.coalesce = coalesce
+        self.max_queued = max_queued
+        self.dropped = 0
+        self.queued = 0
+        self.last_delivery = None
+        self.latest = {}
+        self.deferred = {}
+        self.timer = None
+
+    def admit(self):
+        """ Checks the rate limit, counting the event as delivered if it passes.
+        @rtype: C{bool}
+        """
+        if self.min_interval:
+            now = time.monotonic()
+            if self.last_delivery is not None and now - self.last_delivery < self.min_interval:
+                self.dropped += 1
+                return False
+            self.last_delivery = now
+        return True
+
+    def get_delay(self):
+        """ Returns the time in seconds before the rate limit lets an event through.
+        @rtype: C{float}
+        """
+        if not self.min_interval or self.last_delivery is None:
+            return 0
+        return max(0, self.last_delivery + self.min_interval - time.monotonic())
+
+    def enqueue(self, entry):
+        """ Applies the policy to an event about to be queued.
+        @param entry: Pending entry of the event, see C{L{Manager.pending}}.
+        @type entry: C{list}
+        @return: C{True} if the entry has to be queued.
+        @rtype: C{bool}
+        """
+        event = entry[0]
+        if self.coalesce:
+            key = self.get_key(event)
+            queued_entry = self.latest.get(key)
+            if queued_entry is not None:
+                queued_entry[0] = event
+                return False
+        if not self.admit():
+            return False
+        if self.max_queued is not None and self.queued >= self.max_queued:
+            self.dropped += 1
+            return False
+        self.queued += 1
+        if self.coalesce:
+            entry[3] = key
+            self.latest[key] = entry
+        return True
+
+    def dequeue(self, key):
+        self.queued -= 1
+        if key is not None:
+            del self.latest[key]
+
+    def get_key(self, event):
+        """ Returns the coalescing key of an event: its type and the C{'source'} of its content if any, its source otherwise. """
+        content = event.content
+        if isinstance(content, dict) and 'source' in content:
+            return (event.type, content['source'])
+        return (event.type, event.source)
     
+def _handler_name(function):
+    if isinstance(function, functools.partial):
+        function = function.args[0]
+    return getattr(function, '__qualname__', repr(function))
+
+
+class Instrumentation(object):
+    """ Statistics of the event-system, enabled with C{L{Manager.enable_instrumentation}}.
+    Launches and deliveries are counted per event type; each handler call is timed into a histogram of C{HISTOGRAM_BOUNDS} buckets.
+    @cvar HISTOGRAM_BOUNDS: Upper bounds in seconds of the histogram buckets, the last bucket holds the slower calls.
+    @type HISTOGRAM_BOUNDS: C{tuple<float>}
+    @ivar budget: Handler duration in seconds above which a warning is logged.
+    @type budget: C{float}
+    """
+    HISTOGRAM_BOUNDS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+    def __init__(self, budget=0.01):
+        """ Instrumentation constructor.
+        @param budget: Handler duration in seconds above which a warning is logged.
+        @type budget: C{float}
+        """
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._dump_source = None
+        self.reset()
+
+    def reset(self):
+        """ Clears all the statistics. """
+        with self._lock:
+            self.launches = collections.Counter()
+            self.deliveries = collections.Counter()
+            self.handlers = {}
+            self.started = time.time()
+
+    def count_launch(self, event_type):
+        self.launches[event_type] += 1
+
+    def wrap(self, event_type, function):
+        """ Returns a dispatch table handler timing C{function}. """
+        return functools.partial(self._timed, event_type, _handler_name(function), function)
+
+    def _timed(self, event_type, name, function, obj, event):
+        start = time.perf_counter()
+        try:
+            function(obj, event)
+        finally:
+            self.record(event_type, name, time.perf_counter() - start)
+
+    def record(self, event_type, name, duration):
+        """ Records a handler call.
+        @param event_type: Type of the handled event.
+        @type event_type: C{str}
+        @param name: Handler name.
+        @type name: C{str}
+        @param duration: Duration of the call in seconds.
+        @type duration: C{float}
+        """
+        with self._lock:
+            self.deliveries[event_type] += 1
+            stats = self.handlers.get(name)
+            if stats is None:
+                stats = self.handlers[name] = {'calls': 0, 'total': 0.0, 'max': 0.0, 'over_budget': 0, 'histogram': [0] * (len(self.HISTOGRAM_BOUNDS) + 1)}
+            stats['calls'] += 1
+            stats['total'] += duration
+            stats['max'] = max(stats['max'], duration)
+            stats['histogram'][bisect.bisect_left(self.HISTOGRAM_BOUNDS, duration)] += 1
+            if duration > self.budget:
+                stats['over_budget'] += 1
+        if duration > self.budget:
+            logger.warning('Handler %s took %.1f ms for event %s, over the %.1f ms budget', name, duration * 1000, event_type, self.budget * 1000)
+
+    def snapshot(self):
+        """ Returns a copy of the statistics, serializable as JSON.
+        @rtype: C{dict}
+        """
+        labels = ['<={0}'.format(bound) for bound in self.HISTOGRAM_BOUNDS] + ['>{0}'.format(self.HISTOGRAM_BOUNDS[-1])]
+        with self._lock:
+            handlers = {}
+            for name, stats in self.handlers.items():
+                handlers[name] = dict(stats, histogram=dict(zip(labels, stats['histogram'])), mean=stats['total'] / stats['calls'])
+            return {
+                'since': self.started,
+                'duration': time.time() - self.started,
+                'launches': dict(self.launches),
+                'deliveries': dict(self.deliveries),
+                'handlers': handlers,
+            }
+
+    def dump(self, filename):
+        """ Writes a snapshot of the statistics to a JSON file.
+        @param filename: Path of the file, replaced atomically.
+        @type filename: C{str}
+        @return: C{True}, so that it can be used as a GLib timeout callback.
+        @rtype: C{bool}
+        """
+        tmp_filename = '{0}.tmp'.format(filename)
+        with open(tmp_filename, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2, sort_keys=True)
+        os.replace(tmp_filename, filename)
+        return True
+
+    def start_dump(self, filename, interval=5):
+        """ Periodically dumps the statistics from the GLib main loop.
+        @param filename: Path of the JSON file.
+        @type filename: C{str}
+        @param interval: Period in seconds.
+        @type interval: C{int}
+        """
+        from gi.repository import GLib
+        self.stop_dump()
+        self._dump_source = GLib.timeout_add_seconds(interval, self.dump, filename)
+
+    def stop_dump(self):
+        if self._dump_source is not None:
+            from gi.repository import GLib
+            GLib.source_remove(self._dump_source)
+            self._dump_source = None
+
+
 class Listener(object):
     """ Generic class for listening to events.
     
@@ -131,8 +623,12 @@ class Listener(object):
     @type event_default: C{str}
     @ivar silent: Silent flag. If C{False}, C{L{UnhandledEventError}} is raised if an event cannot be handled. If C{True}, do nothing, listener does not handle the event.
     @type silent: C{str}
+    @ivar event_threaded: Threaded flag. If C{True}, handlers run on the event manager thread pool instead of the dispatching thread, in order.
+    @type event_threaded: C{bool}
+    @ivar event_queue: Events waiting to be handled, for threaded listeners.
+    @type event_queue: C{deque}
     """
-    def __init__(self, prefix='evt_', suffix='', default='eventPerformed', silent=False):
+    def __init__(self, prefix='evt_', suffix='', default='eventPerformed', silent=False, threaded=False):
         """ Listener constructor.
         @param prefix: Prefix for all event-specific handler function name.
         @type prefix: C{str}
@@ -142,12 +638,40 @@ class Listener(object):
         @type default: C{str}
         @param silent: Silent flag.
         @type silent: C{bool}
+        @param threaded: Threaded flag.
+        @type threaded: C{bool}
         """
         self.event_manager = Manager.instance
         self.event_pattern = prefix + '{0}' + suffix
         self.event_default = default
         self.event_silent = silent
+        self.event_threaded = threaded
+        self.event_queue = collections.deque()
+        self.event_queue_busy = False
         #logger.debug('Dispatcher in use is %s' %dispatcher)
+
+    def resolve_handler(self, event_type):
+        """ Finds the method handling an event type.
+        The event-specific handler is looked up first, then the default one. Handlers are resolved once when registering, so methods added afterwards need the event to be registered again.
+        @param event_type: Type of the event to handle.
+        @type event_type: C{str}
+        @return: Bound handler method; if none is found, a handler raising C{L{UnhandledEventError}}, or C{None} if the silent flag is set.
+        @rtype: callable
+        """
+        function = getattr(self, self.event_pattern.format(event_type), None)
+        if function is not None:
+            if callable(function):
+                return function
+            logger.warning('Event-specific handler found but not callable.')
+        function = getattr(self, self.event_default, None)
+        if callable(function):
+            return function
+        if self.event_silent:
+            return None
+        return self._unhandled_event
+
+    def _unhandled_event(self, event):
+        raise UnhandledEventError('{0} has no method to handle {1}'.format(self, event))
         
     def register_event(self, *event_types):
         """ Registers itself to a new event.
@@ -190,10 +714,23 @@ class Launcher(object):
         @param content: Content to attach with the event (Optional).
         @type content: any
         """
-        if event_type not in log_ignores:
-            logger.debug('Launching event type {0} from {1}'.format(event_type, self))
+        instrumentation = self.event_manager.instrumentation
+        if instrumentation is not None:
+            instrumentation.count_launch(event_type)
+        if fast_path and event_type not in self.event_manager.dispatch_table:
+            return
+        if event_type not in log_ignores and logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Launching event type %s from %s', event_type, self)
         self.event_manager.dispatch_event(Event(event_type, self, content))
 
+    def has_listeners(self, event_type):
+        """ Checks whether an event type is listened, e.g. to avoid computing the content of an event nobody receives.
+        @param event_type: Type of the event.
+        @type event_type: C{str}
+        @rtype: C{bool}
+        """
+        return event_type in self.event_manager.dispatch_table
+
 
 class User(Launcher, Listener):
     """ Generic class for both launching and listening to events.
@@ -205,14 +742,23 @@ class User(Launcher, Listener):
 
 class forward_event(User):
     """ Listen for an event type and forward these events as another event type.
+    As listeners are only weakly referenced, forwarders are kept alive in C{instances} until C{L{close}} is called, so that they can be created without keeping a reference.
     """
+    instances = set()
+
     def __init__(self, input_event_type, output_event_type,
                                                       overridden_content=None):
         User.__init__(self)
-        self.register_event(input_event_type)
         self.event_type = output_event_type
         self.content = overridden_content
         setattr(self, 'evt_' + input_event_type, self.forward)
+        self.register_event(input_event_type)
+        forward_event.instances.add(self)
+
+    def close(self):
+        """ Stops forwarding and releases the forwarder. """
+        self.unregister_all_events()
+        forward_event.instances.discard(self)
     
     def forward(self, event):
         content = self.content
@@ -229,6 +775,11 @@ class forward_gsignal(User):
         self.event_type = event_type
     
     def __call__(self, source, *args):
+        instrumentation = self.event_manager.instrumentation
+        if instrumentation is not None:
+            instrumentation.count_launch(self.event_type)
+        if fast_path and self.event_type not in self.event_manager.dispatch_table:
+            return
         nb_args = len(args)
         if nb_args == 0:
             content = None
@@ -248,6 +799,8 @@ class Event(object):
     @ivar content: Content attached to the event (C{None} if none).
     @type content: any
     """
+    __slots__ = ('type', 'source', 'content')
+
     def __init__(self, type, source, content):
         """ Event constructor.
         @param type: Type of the event.
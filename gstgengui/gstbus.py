@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# * This Program is free software; you can redistribute it and/or
+# * modify it under the terms of the GNU Lesser General Public
+# * License as published by the Free Software Foundation; either
+# * version 2.1 of the License, or (at your option) any later version.
+# *
+# * Libav is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# * Lesser General Public License for more details.
+# *
+# * You should have received a copy of the GNU Lesser General Public
+# * License along with Libav; if not, write to the Free Software
+# * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Gstbus: bus message processing off the main loop
+
+Bus watches are dispatched from a BusDispatcher, a thread running its own
+GLib main context, which can serve the buses of many pipelines (e.g. every
+instance of a pipeline pool) without polling. Messages are routed through a
+table of handlers per message type; only handlers registered with
+main_loop=True are called from the GLib main loop.
+
+Copyright 2013, Dirk Van Haerenborgh, under the terms of LGPL
+
+"""
+__author__ = ("Florent Thiery <fthiery@gmail.com>", "Dirk Van Haerenborgh <vhdirk@gmail.com>")
+
+import threading
+import logging
+logger = logging.getLogger('Gstbus')
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib, Gst
+
+
+class BusDispatcher(object):
+    """
+    A thread dispatching the watches of any number of buses from its own main context
+    """
+    def __init__(self, name="bus"):
+        self.name = name
+        self.context = GLib.MainContext()
+        self.loop = GLib.MainLoop(self.context)
+        self._thread = threading.Thread(target=self._run, name=name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        self.context.push_thread_default()
+        self.loop.run()
+        self.context.pop_thread_default()
+
+    def invoke(self, function, *args):
+        """
+        Calls function(*args) from the dispatcher thread
+        """
+        source = GLib.Idle()
+        source.set_callback(self._call_once, (function, args))
+        source.attach(self.context)
+
+    def _call_once(self, data):
+        function, args = data
+        try:
+            function(*args)
+        except Exception:
+            logger.exception("Error in bus dispatcher {0}".format(self.name))
+        return False
+
+    def watch(self, bus, watcher):
+        self.invoke(self._add_watch, bus, watcher)
+
+    def unwatch(self, bus):
+        self.invoke(self._remove_watch, bus)
+
+    def _add_watch(self, bus, watcher):
+        # runs in the dispatcher thread, so that the watch is attached to its context
+        if watcher.bus is not bus:
+            return
+        if not bus.add_watch(GLib.PRIORITY_DEFAULT, self._on_message, watcher):
+            logger.error("Could not watch the bus of {0}".format(watcher.name))
+
+    def _remove_watch(self, bus):
+        bus.remove_watch()
+
+    def _on_message(self, bus, message, watcher):
+        if watcher.bus is bus:
+            watcher.dispatch(bus, message)
+        return True
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.loop.quit()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+
+class BusWatcher(object):
+    def __init__(self, name=None, dispatcher=None):
+        """
+        dispatcher: a BusDispatcher shared with other watchers, by default one is created for this watcher
+        """
+        self.name = name
+        self.handlers = {}
+        self.sync_handlers = []
+        self.mask = Gst.MessageType.UNKNOWN
+        self.bus = None
+        self.dispatcher = dispatcher
+        self._owns_dispatcher = dispatcher is None
+        self._sync_handler_ids = []
+
+    def add_handler(self, message_type, callback, main_loop=False):
+        """
+        Calls callback(bus, message) for every message of the given type,
+        from the bus thread or, if main_loop is set, from the GLib main loop
+        """
+        self.handlers.setdefault(message_type, []).append((callback, main_loop))
+        self.mask |= message_type
+
+    def remove_handler(self, message_type, callback):
+        handlers = [handler for handler in self.handlers.get(message_type, []) if handler[0] != callback]
+        if handlers:
+            self.handlers[message_type] = handlers
+        else:
+            self.handlers.pop(message_type, None)
+            self.mask = Gst.MessageType.UNKNOWN
+            for message_type in self.handlers:
+                self.mask |= message_type
+
+    def add_sync_handler(self, detail, callback):
+        """
+        Connects callback to the sync-message::<detail> signal of the bus,
+        now and whenever another bus is attached
+        """
+        self.sync_handlers.append((detail, callback))
+        if self.bus is not None:
+            self.connect_sync_handlers(self.bus, [(detail, callback)])
+
+    def connect_sync_handlers(self, bus, sync_handlers=None):
+        """
+        Connects the sync handlers to a bus, e.g. the one of a pipeline prerolling in the background
+        Returns the connected handler ids
+        """
+        handler_ids = []
+        if sync_handlers is None:
+            sync_handlers = self.sync_handlers
+        if sync_handlers:
+            bus.enable_sync_message_emission()
+            for detail, callback in sync_handlers:
+                handler_ids.append(bus.connect('sync-message::{0}'.format(detail), callback))
+        if bus is self.bus:
+            self._sync_handler_ids.extend(handler_ids)
+        return handler_ids
+
+    def attach(self, bus):
+        self.detach()
+        if self.dispatcher is None:
+            self.dispatcher = BusDispatcher("bus-{0}".format(self.name))
+        self.bus = bus
+        self.connect_sync_handlers(bus)
+        self.dispatcher.watch(bus, self)
+
+    def detach(self):
+        bus = self.bus
+        if bus is None:
+            return
+        # messages still being dispatched from the old bus are ignored from now on
+        self.bus = None
+        for handler_id in self._sync_handler_ids:
+            bus.disconnect(handler_id)
+        self._sync_handler_ids = []
+        self.dispatcher.unwatch(bus)
+
+    def close(self):
+        """
+        Detaches the bus, and stops the dispatcher thread unless it is shared
+        """
+        self.detach()
+        if self._owns_dispatcher and self.dispatcher is not None:
+            self.dispatcher.stop()
+            self.dispatcher = None
+
+    def dispatch(self, bus, message):
+        if not message.type & self.mask:
+            return
+        for callback, main_loop in self.handlers.get(message.type, ()):
+            if main_loop:
+                GLib.idle_add(self._call_once, callback, bus, message)
+            else:
+                try:
+                    callback(bus, message)
+                except Exception:
+                    logger.exception("Error while handling message {0}".format(message.type))
+
+    def _call_once(self, callback, bus, message):
+        callback(bus, message)
+        return False
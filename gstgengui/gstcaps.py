@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# * This Program is free software; you can redistribute it and/or
+# * modify it under the terms of the GNU Lesser General Public
+# * License as published by the Free Software Foundation; either
+# * version 2.1 of the License, or (at your option) any later version.
+# *
+# * Libav is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# * Lesser General Public License for more details.
+# *
+# * You should have received a copy of the GNU Lesser General Public
+# * License along with Libav; if not, write to the Free Software
+# * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Gstcaps: caps negotiation tracker
+
+Listens for CAPS events on every pad of a pipeline, records the negotiated
+caps with timestamps, counts renegotiations and flags pads renegotiating
+more than max_renegotiations times within window seconds.
+
+Only the src pads of elements (not of bins) are probed, so that each link
+is counted once, under the name of its src pad; elements added while the
+pipeline runs are followed.
+
+Copyright 2013, Dirk Van Haerenborgh, under the terms of LGPL
+
+"""
+__author__ = ("Florent Thiery <fthiery@gmail.com>", "Dirk Van Haerenborgh <vhdirk@gmail.com>")
+
+import time
+import threading
+import collections
+import logging
+logger = logging.getLogger('Gstcaps')
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+
+def add_caps_probe(pad, callback, *args):
+    """
+    Calls callback(pad, caps, *args) for every CAPS event going through pad
+    Returns the probe id
+    """
+    return pad.add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, _on_pad_event, callback, args)
+
+
+def _on_pad_event(pad, info, callback, args):
+    event = info.get_event()
+    if event.type == Gst.EventType.CAPS:
+        callback(pad, event.parse_caps(), *args)
+    return Gst.PadProbeReturn.OK
+
+
+class PadCaps(object):
+    def __init__(self, path, history):
+        self.path = path
+        self.history = collections.deque(maxlen=history)
+        self.negotiations = 0
+        self.recent = collections.deque()
+        self.flagged = False
+
+    @property
+    def renegotiations(self):
+        return max(0, self.negotiations - 1)
+
+    @property
+    def caps(self):
+        return self.history[-1][1] if self.history else None
+
+
+class CapsTracker(object):
+    def __init__(self, manager, history=10, max_renegotiations=3, window=10.0):
+        self.manager = manager
+        self.history = history
+        self.max_renegotiations = max_renegotiations
+        self.window = window
+        self.pads = {}
+        # guards the probes and handlers, elements and pads being added from streaming threads
+        self._lock = threading.Lock()
+        self._probes = []
+        self._handler_ids = []
+        self._tracked = set()
+
+    def start(self):
+        pipeline = self.manager.pipeline
+        self._handler_ids.append((pipeline, pipeline.connect('deep-element-added', self._on_element_added)))
+        iterator = pipeline.iterate_recurse()
+        while True:
+            result, element = iterator.next()
+            if result == Gst.IteratorResult.OK:
+                self._track_element(element)
+            elif result == Gst.IteratorResult.RESYNC:
+                iterator.resync()
+            else:
+                break
+        return self
+
+    def stop(self):
+        with self._lock:
+            probes, self._probes = self._probes, []
+            handler_ids, self._handler_ids = self._handler_ids, []
+            self._tracked = set()
+        for pad, probe_id in probes:
+            pad.remove_probe(probe_id)
+        for gobject, handler_id in handler_ids:
+            gobject.disconnect(handler_id)
+
+    def _track_element(self, element):
+        # the ghost pads of bins proxy the pads of their children
+        if isinstance(element, Gst.Bin):
+            return
+        with self._lock:
+            if element in self._tracked:
+                return
+            self._tracked.add(element)
+            for pad in element.srcpads:
+                self._probes.append((pad, add_caps_probe(pad, self._on_caps)))
+            self._handler_ids.append((element, element.connect('pad-added', self._on_pad_added)))
+
+    def _on_element_added(self, pipeline, bin, element):
+        self._track_element(element)
+
+    def _on_pad_added(self, element, pad):
+        if pad.get_direction() == Gst.PadDirection.SRC:
+            with self._lock:
+                if element not in self._tracked:
+                    return
+                self._probes.append((pad, add_caps_probe(pad, self._on_caps)))
+
+    def _on_caps(self, pad, caps):
+        # called from streaming threads
+        now = time.time()
+        path = pad.get_path_string()
+        pad_caps = self.pads.get(path)
+        if pad_caps is None:
+            pad_caps = self.pads[path] = PadCaps(path, self.history)
+        caps_string = caps.to_string()
+        pad_caps.history.append((now, caps_string))
+        pad_caps.negotiations += 1
+        if pad_caps.negotiations == 1:
+            return
+        pad_caps.recent.append(now)
+        while pad_caps.recent and pad_caps.recent[0] < now - self.window:
+            pad_caps.recent.popleft()
+        if len(pad_caps.recent) > self.max_renegotiations and not pad_caps.flagged:
+            pad_caps.flagged = True
+            logger.warning("Pad {0} renegotiated caps {1} times in {2} s".format(path, len(pad_caps.recent), self.window))
+            self.manager.launch_event_from_bus("caps_renegotiation", {"source": path, "count": pad_caps.renegotiations, "caps": caps_string})
+
+    def report(self):
+        """
+        Returns per pad caps statistics, the most renegotiated pads first
+        """
+        rows = [{
+            "pad": pad_caps.path,
+            "caps": pad_caps.caps,
+            "negotiated_at": pad_caps.history[-1][0],
+            "renegotiations": pad_caps.renegotiations,
+            "flagged": pad_caps.flagged,
+            "history": list(pad_caps.history),
+        } for pad_caps in list(self.pads.values())]
+        rows.sort(key=lambda row: row["renegotiations"], reverse=True)
+        return rows
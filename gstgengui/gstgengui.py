@@ -27,18 +27,12 @@ __package__= 'gstgengui'
 
 
 import os
-os.environ['GI_TYPELIB_PATH'] = "/usr/local/lib/girepository-1.0:/usr/lib/girepository-1.0"
-
 import sys
 import logging
 logger = logging.getLogger('gstgengui')
 
-import gi
-gi.require_version('Gst', '1.0')
-from gi.repository import GObject, Gst, Gtk
-
-from .gstmanager import PipelineManager
-from .gtk_controller import GtkGstController
+from . import startup
+# GStreamer is only loaded by init(), once the arguments are parsed
 
 
 def init():
@@ -46,7 +40,10 @@ def init():
         assert os.environ.get('GST_DEBUG_DUMP_DOT_DIR', None)
     except (NameError, AssertionError):
         os.environ['GST_DEBUG_DUMP_DOT_DIR'] = os.getcwd()
-        
+
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import GObject, Gst
     GObject.threads_init()
     Gst.init(None)
     Gst.debug_set_active(True)
@@ -63,6 +60,15 @@ def parse_args(pipeline):
     return desc
 
 
+# the startup profile is printed even if the pipeline does not reach PLAYING within this delay
+STARTUP_PROFILE_TIMEOUT_MS = 10000
+
+
+def _on_started(state):
+    startup.mark("pipeline playing" if state is not None else "timed out waiting for PLAYING")
+    sys.stderr.write(startup.format_report() + "\n")
+
+
 def main():
 
     import argparse
@@ -71,9 +77,17 @@ def main():
     parser.add_argument('-m', "--messages", action="store_true", dest="show_messages", default=False, help="Show gst.Element messages window before setting the pipeline to PLAYING")
     parser.add_argument('-c', "--config", dest="config", help="Loads the given configuration file")
     parser.add_argument('-p', "--preview", action="store_false", dest="display_preview", default=True, help="Disable inline preview")
+    parser.add_argument('-s', "--standby-refresh", action="store_true", dest="standby_refresh", default=False, help="Preroll the refreshed pipeline while the current one keeps playing, then swap them")
+    parser.add_argument('-n', "--instances", dest="instances", type=int, default=1, help="Number of pipeline instances to run; $index and $name are substituted in the description")
+    parser.add_argument("--substitute", dest="substitutions", action="append", default=[], metavar="KEY=V1,V2", help="Substitute $KEY in the description of instance i with value i modulo the number of values")
+    parser.add_argument('-t', "--target", dest="target", default="0", help="Instance controlled by the GUI: an index, a name, or 'all'")
+    parser.add_argument("--headless", action="store_true", dest="headless", default=False, help="Run without GUI, see gstgengui-headless --help for its options")
+    parser.add_argument("--event-stats", dest="event_stats", help="Periodically dump event counts and handler timings to the given JSON file")
+    parser.add_argument("--startup-profile", action="store_true", dest="startup_profile", default=False, help="Print the duration of each startup step once the pipeline is playing")
     parser.add_argument('pipeline', nargs='*', help='Pipeline description')
 
     args = parser.parse_args()
+    startup.mark("arguments parsed")
 
     if args.verbose:
         verbosity = 'DEBUG'
@@ -92,7 +106,8 @@ def main():
         'name': None,
         'pipeline_desc': None,
         'ignore_list': ['parent'],
-        'display_preview': False
+        'display_preview': False,
+        'event_policies': {}
     }
 
     if args.config:
@@ -111,10 +126,51 @@ def main():
         sys.exit(1)
         
     init()
+    startup.mark("GStreamer initialized")
+
+    from gi.repository import GLib, Gst
+    from .gstmanager import PipelineManager, easyevent
+    startup.mark("pipeline manager imported")
+
+    for event_type, policy in configuration['event_policies'].items():
+        easyevent.Manager.instance.set_event_policy(event_type, **policy)
+
+    if args.event_stats:
+        easyevent.Manager.instance.enable_instrumentation().start_dump(args.event_stats)
+
+    pool = None
+    if args.instances > 1:
+        from .gstpool import PipelinePool
+        substitutions = dict((key, values.split(',')) for key, values in (arg.split('=', 1) for arg in args.substitutions))
+        pool = PipelinePool(configuration['pipeline_desc'], args.instances, substitutions, configuration['name'] or "pipeline")
+        pool.enable_throughput()
+        targets = pool.select(args.target)
+        if not targets:
+            logger.error("No pipeline instance matches {0}, quitting".format(args.target))
+            sys.exit(1)
+        pipeline_launcher = targets[0]
+        if args.target != 'all':
+            # the other instances run alongside the controlled one
+            for manager in pool.managers:
+                if manager is not pipeline_launcher:
+                    GLib.idle_add(manager.run)
+            pool = None
+    else:
+        pipeline_launcher = PipelineManager(configuration['pipeline_desc'], configuration['name'])
+    startup.mark("pipeline parsed")
+
+    if args.startup_profile:
+        pipeline_launcher.wait_for_state(Gst.State.PLAYING, _on_started, STARTUP_PROFILE_TIMEOUT_MS)
 
-    pipeline_launcher = PipelineManager(configuration['pipeline_desc'], configuration['name'])
+    if args.headless:
+        from .headless import HeadlessController
+        controller = HeadlessController(pipeline_launcher, pool)
+        sys.exit(controller.main())
 
-    controller = GtkGstController(pipeline_launcher, args.show_messages, configuration['display_preview'], configuration['ignore_list'])
+    from .gtk_controller import GtkGstController
+    startup.mark("GTK controller imported")
+    controller = GtkGstController(pipeline_launcher, args.show_messages, configuration['display_preview'], configuration['ignore_list'], args.standby_refresh, pool)
+    startup.mark("GTK controller created")
 
     controller.gtk_main()
     
@@ -32,7 +32,7 @@ logger = logging.getLogger('Gst-gengui')
 
 import gi
 gi.require_version('Gst', '1.0')
-from gi.repository import GLib, GObject, Gst, Gio, Gtk
+from gi.repository import GObject, Gst
 
 IGNORE_LIST = []
 
@@ -42,121 +42,309 @@ INT_GTYPES = (GObject.TYPE_INT, GObject.TYPE_UINT, GObject.TYPE_LONG, GObject.TY
 
 STRING_GTYPES = (GObject.TYPE_CHAR, GObject.TYPE_UCHAR, GObject.TYPE_UNICHAR, GObject.TYPE_GSTRING, GObject.TYPE_STRING)
 
+class PropertyDescriptor(object):
+    """
+    Immutable metadata of a property, shared by all the elements of a type
+    """
+    __slots__ = ('name', 'description', 'default_value', 'human_name', 'value_type', 'is_readonly',
+                 'kind', 'minimum', 'maximum', 'is_int', 'values_list')
+
+    def __init__(self, pspec):
+        self.name = pspec.name
+        self.description = pspec.blurb
+        self.default_value = pspec.default_value
+        self.human_name = pspec.nick
+        self.value_type = pspec.value_type
+        self.is_readonly = (pspec.flags == 225)
+        self.minimum = self.maximum = None
+        self.is_int = False
+        self.values_list = ()
+        if pspec.value_type in NUMBER_GTYPES:
+            self.kind = 'number'
+            self.minimum = pspec.minimum
+            self.maximum = pspec.maximum
+            self.is_int = pspec.value_type in INT_GTYPES
+        elif pspec.value_type == GObject.TYPE_BOOLEAN:
+            self.kind = 'boolean'
+        elif pspec.value_type in STRING_GTYPES:
+            self.kind = 'string'
+        elif pspec.value_type.is_a(GObject.TYPE_ENUM):
+            self.kind = 'enum'
+            self.value_type = GObject.TYPE_ENUM
+            if pspec.__gtype__.has_value_table:
+                values = pspec.enum_class.__enum_values__
+                # FIXME: find more proper way to do it (check buzztard)
+                # Nb: l'index, value_name et value_nick peuvent tous deux etre utilisés pour set_property
+                self.values_list = tuple(values[index].value_name for index in values)
+        else:
+            self.kind = None
+
+
+class TypeDescriptor(object):
+    """
+    Property descriptors and interfaces of a GType, built once per type
+    """
+    def __init__(self, gtype):
+        self.gtype = gtype
+        self.implements_childproxy = GObject.type_from_name("GstChildProxy") in GObject.type_interfaces(gtype)
+        self.properties = []
+        for pspec in GObject.list_properties(gtype):
+            descriptor = PropertyDescriptor(pspec)
+            if descriptor.kind is None:
+                logger.error("Property '{0}' of {1} with type {2} has no associated known types, skipping".format(pspec.name, gtype.name, pspec.value_type))
+            else:
+                self.properties.append(descriptor)
+
+
+_type_descriptors = {}
+
+
+def get_type_descriptor(gtype):
+    """
+    Returns the cached TypeDescriptor of gtype
+    """
+    descriptor = _type_descriptors.get(gtype)
+    if descriptor is None:
+        descriptor = _type_descriptors[gtype] = TypeDescriptor(gtype)
+    return descriptor
+
+
+# value of properties not read yet
+_UNREAD = object()
+
+
+def _descriptor_field(name):
+    # read only attribute of a Property, read from its shared descriptor
+    return property(lambda self: getattr(self.descriptor, name))
+
+
 class Property(object):
-    def __init__(self, property, parent_element):
+    name = _descriptor_field('name')
+    description = _descriptor_field('description')
+    default_value = _descriptor_field('default_value')
+    human_name = _descriptor_field('human_name')
+    value_type = _descriptor_field('value_type')
+    is_readonly = _descriptor_field('is_readonly')
+
+    def __init__(self, descriptor, parent_element):
+        self.descriptor = descriptor
         self.parent_element = parent_element
-        self.description = property.blurb
-        self.default_value = property.default_value
-        self.name = property.name
-        self.human_name = property.nick
-        self.value_type = property.value_type
-        self.is_readonly = (property.flags == 225)
-        self.update_value()
+        # some getters are expensive or block (stats, last-sample, caps), values are read on first access
+        self._value = _UNREAD
+
+    @property
+    def value(self):
+        if self._value is _UNREAD:
+            self.update_value()
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
+    @property
+    def is_read(self):
+        return self._value is not _UNREAD
 
     def update_value(self):
-        value = self.parent_element._Gst_element.get_property(self.name)
+        self._set_read_value(self.parent_element._Gst_element.get_property(self.name))
+
+    def _set_read_value(self, value):
         if value is None:
             if self.default_value is not None:
                 value = self.default_value
             else:
                 value = "Default"
-        self.value = value
+        self._value = value
 
 class BooleanProperty(Property):
-    def __init__(self, property, parent_element):
-        Property.__init__(self, property, parent_element)
+    pass
 
 class StringProperty(Property):
-    def __init__(self, property, parent_element):
-        Property.__init__(self, property, parent_element)
+    pass
 
 class NumberProperty(Property):
-    def __init__(self, property, parent_element):
-        Property.__init__(self, property, parent_element)
-        self.minimum = property.minimum
-        self.maximum = property.maximum       
-        self.is_int = self.value_type in INT_GTYPES
+    minimum = _descriptor_field('minimum')
+    maximum = _descriptor_field('maximum')
+    is_int = _descriptor_field('is_int')
 
 class EnumProperty(Property):
-    def __init__(self, property, parent_element):
-        Property.__init__(self, property, parent_element)
-        self.value_type = GObject.TYPE_ENUM
-        self.values_list = []
-        if property.__gtype__.has_value_table:
-            values = property.enum_class.__enum_values__
-            for index in values:
-                self.values_list.append(values[index].value_name)
-                # FIXME: find more proper way to do it (check buzztard)
-                # Nb: l'index, value_name et value_nick peuvent tous deux etre utilisés pour set_property
+    values_list = _descriptor_field('values_list')
+
+PROPERTY_CLASSES = {'number': NumberProperty, 'boolean': BooleanProperty, 'string': StringProperty, 'enum': EnumProperty}
 
 class Element(object):
-    def __init__(self, Gst_element, ignore_list=IGNORE_LIST):
+    def __init__(self, Gst_element, ignore_list=IGNORE_LIST, parent=None, introspector=None):
         self._Gst_element = Gst_element
-        _properties_list = GObject.list_properties(self._Gst_element)
-        self.children = []
-        
-        #print( Gst.Object.get_properties(self._Gst_element))
+        self.ignore_list = ignore_list
+        self.parent = parent
+        self.introspector = introspector
+        type_descriptor = get_type_descriptor(Gst_element.__gtype__)
+        # child Gst objects -> Element, kept up to date from the child-added/child-removed signals
+        self._children = {}
+        self._handler_ids = []
+        self._child_added_callbacks = []
+        self._child_removed_callbacks = []
         
-        self.implements_childproxy = GObject.type_from_name("GstChildProxy") in GObject.type_interfaces(self._Gst_element)
+        self.implements_childproxy = type_descriptor.implements_childproxy
         
         if (self.implements_childproxy):
             for i in range(self._Gst_element.get_children_count()):
-                self.children.append(Element(self._Gst_element.get_child_by_index(i)))
+                self._add_child(self._Gst_element.get_child_by_index(i))
+            self._handler_ids.append(self._Gst_element.connect("child-added", self._on_child_added))
+            self._handler_ids.append(self._Gst_element.connect("child-removed", self._on_child_removed))
         
         if hasattr(self._Gst_element, "get_factory"):
             self.name = self._Gst_element.get_factory().get_name()
         else:
             self.name = self._Gst_element.get_name()
 
-        self.number_properties = number_properties = []
-        self.boolean_properties = boolean_properties = []
-        self.string_properties = string_properties = []
-        self.enum_properties = enum_properties = []
+        self.number_properties = []
+        self.boolean_properties = []
+        self.string_properties = []
+        self.enum_properties = []
+        self.properties = []
+        properties_by_kind = {'number': self.number_properties, 'boolean': self.boolean_properties, 'string': self.string_properties, 'enum': self.enum_properties}
 
-        for property in _properties_list:
-            if property.name in ignore_list:
-                logger.debug("Property {0} is in ignore list, skipping".format(property.name))
+        for descriptor in type_descriptor.properties:
+            if descriptor.name in ignore_list:
+                logger.debug("Property {0} is in ignore list, skipping".format(descriptor.name))
+            else:
+                property = PROPERTY_CLASSES[descriptor.kind](descriptor, self)
+                properties_by_kind[descriptor.kind].append(property)
+                self.properties.append(property)
 
-            elif property.value_type in NUMBER_GTYPES:
-                number_property = NumberProperty(property, self)
-                number_properties.append(number_property)
+    def refresh_values(self):
+        """
+        Reads the values of all the properties of the element in one pass
+        """
+        if not self.properties:
+            return
+        values = self._Gst_element.get_properties(*[property.name for property in self.properties])
+        for property, value in zip(self.properties, values):
+            property._set_read_value(value)
 
-            elif property.value_type == GObject.TYPE_BOOLEAN:
-                boolean_property = BooleanProperty(property, self)
-                boolean_properties.append(boolean_property)
+    def set_property(self, property, value):
+        self._Gst_element.set_property(property, value)
 
-            elif property.value_type in STRING_GTYPES: 
-                string_property = StringProperty(property, self)
-                string_properties.append(string_property)
-          
-            elif property.value_type.is_a(GObject.TYPE_ENUM):
-                enum_property = EnumProperty(property, self)
-                enum_properties.append(enum_property)
+    @property
+    def children(self):
+        return list(self._children.values())
 
-            else:
-                logger.error("Property '{0}' with type {1} has no associated known types, skipping".format(property.name, property.value_type))
+    def iter_elements(self):
+        """
+        Yields this element and its descendants, parents first
+        """
+        yield self
+        for child in self.children:
+            for element in child.iter_elements():
+                yield element
+
+    def _add_child(self, child):
+        element = self._children[child] = Element(child, self.ignore_list, self, self.introspector)
+        return element
+
+    def _on_child_added(self, proxy, child, name):
+        # may be called from streaming threads, e.g. by decodebin
+        if child in self._children:
+            return
+        element = self._add_child(child)
+        logger.debug("Child {0} added to {1}".format(name, self.name))
+        for callback in self._child_added_callbacks:
+            callback(element, self.name)
+        if self.introspector is not None:
+            self.introspector._notify(self.introspector._element_added_callbacks, element)
+
+    def _on_child_removed(self, proxy, child, name):
+        element = self._children.pop(child, None)
+        if element is None:
+            return
+        element.disconnect()
+        logger.debug("Child {0} removed from {1}".format(name, self.name))
+        for callback in self._child_removed_callbacks:
+            callback(element, self.name)
+        if self.introspector is not None:
+            self.introspector._notify(self.introspector._element_removed_callbacks, element)
+
+    def disconnect(self):
+        """
+        Stops following the children changes of this element and its descendants
+        """
+        for handler_id in self._handler_ids:
+            self._Gst_element.disconnect(handler_id)
+        self._handler_ids = []
+        for child in self.children:
+            child.disconnect()
 
-    def set_property(self, property, value):
-        self._Gst_element.set_property(property, value)
-        
-        
-    def _child_changed(self, parent, child, name, callback):
-        callback(Element(child), self.name)
-        
     def connect_child_added(self, callback):
-        self._Gst_element.connect("child-added", self._child_changed, callback)
+        """
+        Calls callback(element, parent_name) with the Element of each child added to this one
+        """
+        self._child_added_callbacks.append(callback)
         
     def connect_child_removed(self, callback):
-        self._Gst_element.connect("child-removed", self._child_changed, callback)
+        """
+        Calls callback(element, parent_name) with the Element of each child removed from this one
+        """
+        self._child_removed_callbacks.append(callback)
 
 class PipelineIntrospector(object):
-    def __init__(self, pipeline, ignore_list):
+    def __init__(self, pipeline, ignore_list=IGNORE_LIST, introspect=True):
+        """
+        When introspect is set, the Element tree is kept up to date with the elements
+        added to and removed from the pipeline and its child proxies, see connect_element_added
+        """
         self.pipeline = pipeline
         self.ignore_list = ignore_list
         self.gst_elements = []
-        self.elements = []
+        # top level Gst elements -> Element
+        self._elements = {}
+        self._handler_ids = []
+        self._element_added_callbacks = []
+        self._element_removed_callbacks = []
         self._get_Gst_elements()
-        self._introspect_elements()
+        if introspect:
+            self._introspect_elements()
+
+    @property
+    def elements(self):
+        return list(self._elements.values())
+
+    def iter_elements(self):
+        """
+        Yields all the Elements of the tree, parents first
+        """
+        for element in self.elements:
+            for descendant in element.iter_elements():
+                yield descendant
+
+    def connect_element_added(self, callback):
+        """
+        Calls callback(element) for each Element added to the tree, at any depth;
+        the callback may be called from streaming threads
+        """
+        self._element_added_callbacks.append(callback)
+
+    def connect_element_removed(self, callback):
+        """
+        Calls callback(element) for each Element removed from the tree, at any depth,
+        with its descendants still attached
+        """
+        self._element_removed_callbacks.append(callback)
+
+    def _notify(self, callbacks, element):
+        for callback in callbacks:
+            callback(element)
+
+    def close(self):
+        """
+        Stops following the pipeline changes
+        """
+        for handler_id in self._handler_ids:
+            self.pipeline.disconnect(handler_id)
+        self._handler_ids = []
+        for element in self.elements:
+            element.disconnect()
 
     def _get_Gst_elements(self):
         gstit = self.pipeline.iterate_elements()
@@ -165,10 +353,38 @@ class PipelineIntrospector(object):
             self.gst_elements.insert(0, elt[1])
             elt = gstit.next()
 
+    def get_elements_by_factory(self, *factory_names):
+        """
+        Returns the Gst elements created by one of the given factories, nested bins included
+        """
+        result = []
+        gstit = self.pipeline.iterate_recurse()
+        elt = gstit.next()
+        while(elt[0] == Gst.IteratorResult.OK):
+            factory = elt[1].get_factory()
+            if factory is not None and factory.get_name() in factory_names:
+                result.insert(0, elt[1])
+            elt = gstit.next()
+        return result
+
     def _introspect_elements(self):
         for gst_element in self.gst_elements:
-            element = Element(gst_element, self.ignore_list)
-            self.elements.append(element)
+            self._elements[gst_element] = Element(gst_element, self.ignore_list, None, self)
+        self._handler_ids.append(self.pipeline.connect("element-added", self._on_element_added))
+        self._handler_ids.append(self.pipeline.connect("element-removed", self._on_element_removed))
+
+    def _on_element_added(self, pipeline, gst_element):
+        if gst_element in self._elements:
+            return
+        element = self._elements[gst_element] = Element(gst_element, self.ignore_list, None, self)
+        self._notify(self._element_added_callbacks, element)
+
+    def _on_element_removed(self, pipeline, gst_element):
+        element = self._elements.pop(gst_element, None)
+        if element is None:
+            return
+        element.disconnect()
+        self._notify(self._element_removed_callbacks, element)
 
     def print_all(self):
         print('Printing all of them')
@@ -25,6 +25,10 @@ Copyright 2013, Dirk Van Haerenborgh, under the terms of LGPL
 __author__ = ("Florent Thiery <fthiery@gmail.com>", "Dirk Van Haerenborgh <vhdirk@gmail.com>")
 
 import os
+import time
+import hashlib
+import subprocess
+from math import gcd
 import logging
 
 #logging.basicConfig(level=logging.DEBUG)
@@ -32,7 +36,7 @@ logger = logging.getLogger('Gstmanager')
 
 import gi
 gi.require_version('Gst', '1.0')
-from gi.repository import GObject, Gst, Gtk
+from gi.repository import GLib, GObject, Gst
 
 pipeline_desc = "videotestsrc ! xvimagesink"
 try:
@@ -40,12 +44,182 @@ try:
 except Exception:
     from . import event as easyevent
 
+from .gstbus import BusWatcher
+from .gstseek import Seeker
+from .gstqos import QosCollector
+# gstprofiler, gstqueues and gstcaps are imported when first used
+
+# pipeline graph details drawn by default, all of them covered by the graph fingerprint
+GRAPH_DETAILS = Gst.DebugGraphDetails.MEDIA_TYPE | Gst.DebugGraphDetails.CAPS_DETAILS
+
+# property values are not fingerprinted
+UNCACHED_GRAPH_DETAILS = Gst.DebugGraphDetails.NON_DEFAULT_PARAMS | Gst.DebugGraphDetails.ALL_PARAMS
+
+
+class PipelineState(object):
+    """
+    Pipeline state as last reported by state-changed bus messages,
+    so that it can be read without blocking on a pending state change
+    """
+    def __init__(self):
+        self.current = Gst.State.NULL
+        self.pending = Gst.State.VOID_PENDING
+        self.target = Gst.State.NULL
+        self.changed_at = time.time()
+        self.target_at = self.changed_at
+
+    def set_target(self, state):
+        self.target = state
+        self.target_at = time.time()
+
+    def update(self, old, new, pending):
+        self.current = new
+        self.pending = pending
+        self.changed_at = time.time()
+
+    def is_settled(self):
+        return self.current == self.target and self.pending == Gst.State.VOID_PENDING
+
+
+class PropertyWatch(object):
+    """
+    Handle of a property polled by a PropertyPoller
+    """
+    def __init__(self, poller, element_name, property, interval_ms, callback, only_changes):
+        self.poller = poller
+        self.element_name = element_name
+        self.property = property
+        self.interval_ms = interval_ms
+        self.callback = callback
+        self.only_changes = only_changes
+        self.element = None
+        self.last_value = None
+        self.due = 0
+        # set while the element is missing or its property cannot be read, so that errors are logged once
+        self.failing = False
+
+    def cancel(self):
+        self.poller.remove(self)
+
+
+class PropertyPoller(object):
+    """
+    Polls element properties from a single GObject timeout, ticking at the
+    greatest common divisor of the watched intervals
+    """
+    MIN_TICK_MS = 10
+
+    def __init__(self, element_getter):
+        self.element_getter = element_getter
+        self.watches = []
+        self.tick_ms = None
+        self.source_id = None
+
+    def add(self, element_name, property, interval_ms, callback, only_changes=True):
+        watch = PropertyWatch(self, element_name, property, interval_ms, callback, only_changes)
+        self.watches.append(watch)
+        self._reschedule()
+        return watch
+
+    def remove(self, watch):
+        if watch in self.watches:
+            self.watches.remove(watch)
+            self._reschedule()
+
+    def clear(self):
+        self.watches = []
+        self._reschedule()
+
+    def reset_elements(self):
+        # element references are resolved again on the next tick, e.g. after the pipeline was redefined
+        for watch in self.watches:
+            watch.element = None
+            watch.last_value = None
+
+    def _reschedule(self):
+        tick_ms = None
+        for watch in self.watches:
+            tick_ms = watch.interval_ms if tick_ms is None else gcd(tick_ms, watch.interval_ms)
+        if tick_ms is not None:
+            tick_ms = max(tick_ms, self.MIN_TICK_MS)
+        if tick_ms == self.tick_ms:
+            return
+        if self.source_id is not None:
+            GObject.source_remove(self.source_id)
+            self.source_id = None
+        self.tick_ms = tick_ms
+        if tick_ms is not None:
+            self.source_id = GObject.timeout_add(tick_ms, self._tick)
+
+    def _tick(self):
+        now = time.monotonic() * 1000
+        for watch in list(self.watches):
+            if now < watch.due:
+                continue
+            watch.due = now + watch.interval_ms - self.tick_ms / 2
+            # a missing element or unreadable property is looked up again on the next ticks,
+            # e.g. an element of a pipeline being redefined or added later by decodebin
+            if watch.element is None:
+                watch.element = self.element_getter(watch.element_name)
+                if watch.element is None:
+                    if not watch.failing:
+                        watch.failing = True
+                        logger.error("Cannot poll property {0}: no element named {1}, retrying".format(watch.property, watch.element_name))
+                    continue
+            try:
+                value = watch.element.get_property(watch.property)
+            except Exception as e:
+                # e.g. unknown or write-only property, the other watches keep being polled
+                watch.element = None
+                if not watch.failing:
+                    watch.failing = True
+                    logger.error("Cannot poll property {0} of element {1}: {2}, retrying".format(watch.property, watch.element_name, e))
+                continue
+            if watch.failing:
+                watch.failing = False
+                logger.info("Polling property {0} of element {1} again".format(watch.property, watch.element_name))
+            if watch.only_changes and value == watch.last_value:
+                continue
+            watch.last_value = value
+            try:
+                watch.callback(watch, value)
+            except Exception:
+                logger.exception("Error in the polling callback of property {0} of element {1}".format(watch.property, watch.element_name))
+        return True
+
 
 class PipelineManager(easyevent.User):
-    def __init__(self, pipeline_string=None, name=None):
+    # a standby pipeline not prerolled after this delay is abandoned, see swap_pipeline
+    PREROLL_TIMEOUT_MS = 10000
+
+    def __init__(self, pipeline_string=None, name=None, bus_dispatcher=None):
+        """
+        bus_dispatcher: a gstbus.BusDispatcher serving the bus of this pipeline, shared e.g. by a pipeline pool
+        """
         easyevent.User.__init__(self)
         self.send_debug = False
         self.name = name
+        self.state = PipelineState()
+        self._state_waiters = []
+        # state-changed messages created before this sequence number are obsolete, see _new_state_generation
+        self._state_seqnum = Gst.util_seqnum_next()
+        self.poller = PropertyPoller(self.get_element)
+        # context of the pipeline being prerolled by swap_pipeline
+        self._standby = None
+        self.elements_by_name = {}
+        self._pspecs = {}
+        self._graph_cache = {}
+        self.profiler = None
+        self.queue_monitor = None
+        self.caps_tracker = None
+        self.bus_watcher = BusWatcher(name, bus_dispatcher)
+        self.bus_watcher.add_handler(Gst.MessageType.ERROR, self.on_error_message, main_loop=True)
+        self.bus_watcher.add_handler(Gst.MessageType.EOS, self.on_eos_message, main_loop=True)
+        self.bus_watcher.add_handler(Gst.MessageType.STATE_CHANGED, self.on_state_changed_message)
+        self.bus_watcher.add_handler(Gst.MessageType.ELEMENT, self.on_element_message)
+        self.qos = QosCollector(self)
+        self.bus_watcher.add_handler(Gst.MessageType.QOS, self.qos.on_qos_message)
+        self.seeker = Seeker(self)
         if pipeline_string is not None:
             self.parse_description(pipeline_string)
         else:
@@ -67,9 +241,134 @@ class PipelineManager(easyevent.User):
             logger.debug('Redefining pipeline {0} pipeline to {1}'.format(self.pipeline.get_name(), new_string))
         self.parse_description(new_string)
 
+    def swap_pipeline(self, new_string, on_prepare=None, on_switched=None):
+        """
+        Refreshes the pipeline without stopping it first: the new description is
+        parsed and prerolled to PAUSED while the current pipeline keeps running,
+        then the pipelines are swapped and the new one is set to PLAYING.
+        on_prepare(pipeline) is called before prerolling, e.g. to connect sync
+        handlers to the new bus, and on_switched(manager) once swapped.
+        A standby pipeline still prerolling is cancelled, and one not prerolled
+        within PREROLL_TIMEOUT_MS is abandoned.
+        Returns False if nothing is done (unchanged description or parse error).
+        """
+        if hasattr(self, 'pipeline_desc') and new_string.strip() == self.pipeline_desc.strip():
+            logger.debug("Pipeline description unchanged, not refreshing")
+            return False
+        if self._standby is not None:
+            if new_string.strip() == self._standby['description'].strip():
+                logger.debug("Pipeline description already prerolling, not refreshing")
+                return False
+            self.cancel_swap()
+        started = time.monotonic()
+        try:
+            standby = Gst.parse_launch(new_string)
+        except Exception as e:
+            logger.error('Error in swap_pipeline: {0}'.format(e))
+            self.launch_event('gst_error', str(e))
+            return False
+        if self.name is not None:
+            standby.set_name(self.name)
+        if on_prepare is not None:
+            on_prepare(standby)
+        standby_bus = standby.get_bus()
+        standby_bus.add_signal_watch()
+        context = {'pipeline': standby, 'description': new_string, 'started': started, 'on_switched': on_switched, 'done': False}
+        # e.g. video overlay handlers, needed while prerolling
+        context['sync_handler_ids'] = self.bus_watcher.connect_sync_handlers(standby_bus)
+        context['handler_id'] = standby_bus.connect('message', self._on_standby_message, context)
+        context['timeout_id'] = GObject.timeout_add(self.PREROLL_TIMEOUT_MS, self._on_standby_timeout, context)
+        self._standby = context
+        result = standby.set_state(Gst.State.PAUSED)
+        if result == Gst.StateChangeReturn.FAILURE:
+            self._abort_standby(context, "could not preroll new pipeline")
+        elif result in (Gst.StateChangeReturn.SUCCESS, Gst.StateChangeReturn.NO_PREROLL):
+            GObject.idle_add(self._switch_to_standby, context)
+        return True
+
+    def _on_standby_message(self, bus, message, context):
+        if context['done']:
+            return
+        t = message.type
+        if t == Gst.MessageType.ASYNC_DONE:
+            self._switch_to_standby(context)
+        elif t == Gst.MessageType.ERROR:
+            err, debug = message.parse_error()
+            self._abort_standby(context, "{0} {1}".format(err, debug))
+
+    def _on_standby_timeout(self, context):
+        context['timeout_id'] = None
+        self._abort_standby(context, "new pipeline not prerolled after {0} ms".format(self.PREROLL_TIMEOUT_MS))
+        return False
+
+    def cancel_swap(self):
+        """
+        Drops the standby pipeline being prerolled by swap_pipeline, if any
+        """
+        context = self._standby
+        if context is None:
+            return
+        self._release_standby_bus(context)
+        context['pipeline'].set_state(Gst.State.NULL)
+        logger.info("Cancelled the swap to {0}".format(context['description']))
+
+    def _release_standby_bus(self, context):
+        context['done'] = True
+        if self._standby is context:
+            self._standby = None
+        if context['timeout_id'] is not None:
+            GObject.source_remove(context['timeout_id'])
+            context['timeout_id'] = None
+        bus = context['pipeline'].get_bus()
+        bus.disconnect(context['handler_id'])
+        for handler_id in context['sync_handler_ids']:
+            bus.disconnect(handler_id)
+        bus.remove_signal_watch()
+
+    def _abort_standby(self, context, error_string):
+        if context['done']:
+            return
+        self._release_standby_bus(context)
+        context['pipeline'].set_state(Gst.State.NULL)
+        logger.error("Standby pipeline failed, keeping the current one: {0}".format(error_string))
+        self.launch_event("gst_error", error_string)
+
+    def _switch_to_standby(self, context):
+        if context['done']:
+            return False
+        self._release_standby_bus(context)
+        prerolled = time.monotonic()
+        self.bus_watcher.detach()
+        if hasattr(self, 'pipeline'):
+            self.pipeline.set_state(Gst.State.NULL)
+        self.pipeline = context['pipeline']
+        self.pipeline_desc = context['description']
+        self._new_state_generation()
+        self.state = PipelineState()
+        self.state.update(Gst.State.NULL, Gst.State.PAUSED, Gst.State.VOID_PENDING)
+        self.poller.reset_elements()
+        self.index_elements()
+        self.activate_bus()
+
+        def on_playing(state):
+            if state is None:
+                logger.warning("New pipeline did not reach PLAYING")
+                return
+            latencies = {
+                "preroll": prerolled - context['started'],
+                "switch": time.monotonic() - prerolled,
+            }
+            logger.info("Switched to new pipeline in {0:.3f} s (prerolled in {1:.3f} s)".format(latencies["switch"], latencies["preroll"]))
+            self.launch_event("pipeline_switched", latencies)
+        self.wait_for_state(Gst.State.PLAYING, on_playing, timeout_ms=10000)
+        self.run()
+        if context['on_switched'] is not None:
+            context['on_switched'](self)
+        return False
+
     def is_running(self):
         if hasattr(self, "pipeline"):
-            if self.get_state() == Gst.State.PLAYING:
+            if self.state.current == Gst.State.PLAYING:
                 logger.debug("Pipeline is up and running")
                 return True
             else:
@@ -91,19 +390,84 @@ class PipelineManager(easyevent.User):
             return
         if self.name is not None:
             self.pipeline.set_name(self.name)
+        self._new_state_generation()
+        self.state = PipelineState()
+        self.poller.reset_elements()
+        self.index_elements()
         hstring = self.get_pastable_string(string)
         logger.debug("Launching pipeline {0}; copy-paste the following for manual debugging: \n\ngst-launch-0.10 {1}\n".format(self.pipeline.get_name(), hstring))
         self.activate_bus()
 
+    def index_elements(self):
+        """
+        Builds the name -> element index of the pipeline, nested bins included,
+        and keeps it up to date as elements are added or removed
+        """
+        self.elements_by_name = {}
+        iterator = self.pipeline.iterate_recurse()
+        while True:
+            result, element = iterator.next()
+            if result == Gst.IteratorResult.OK:
+                self.elements_by_name.setdefault(element.get_name(), element)
+            elif result == Gst.IteratorResult.RESYNC:
+                self.elements_by_name = {}
+                iterator.resync()
+            else:
+                break
+        self.pipeline.connect('deep-element-added', self._on_deep_element_added)
+        self.pipeline.connect('deep-element-removed', self._on_deep_element_removed)
+
+    def _on_deep_element_added(self, pipeline, bin, element):
+        self.elements_by_name.setdefault(element.get_name(), element)
+
+    def _on_deep_element_removed(self, pipeline, bin, element):
+        name = element.get_name()
+        if self.elements_by_name.get(name) is element:
+            del self.elements_by_name[name]
+
+    def get_element(self, element_name):
+        element = self.elements_by_name.get(element_name)
+        if element is None:
+            element = self.pipeline.get_by_name(element_name)
+            if element is not None:
+                self.elements_by_name[element_name] = element
+        return element
+
+    def get_pspec(self, element, property_name):
+        """
+        Returns the (cached) ParamSpec of a property of an element
+        """
+        key = (element.__gtype__, property_name)
+        pspec = self._pspecs.get(key)
+        if pspec is None:
+            pspec = self._pspecs[key] = element.find_property(property_name)
+        return pspec
+
+    def coerce_value(self, pspec, value):
+        """
+        Converts string values (e.g. from scripts) to the property type
+        """
+        if not isinstance(value, str) or pspec is None:
+            return value
+        value_type = pspec.value_type
+        if value_type in (GObject.TYPE_INT, GObject.TYPE_UINT, GObject.TYPE_LONG, GObject.TYPE_ULONG, GObject.TYPE_INT64, GObject.TYPE_UINT64):
+            return int(value)
+        elif value_type in (GObject.TYPE_FLOAT, GObject.TYPE_DOUBLE):
+            return float(value)
+        elif value_type == GObject.TYPE_BOOLEAN:
+            return value.lower() in ('1', 'true', 'yes', 'on')
+        elif value_type == Gst.Caps.__gtype__:
+            return Gst.Caps.from_string(value)
+        return value
+
     def activate_bus(self):
         self.bus = self.pipeline.get_bus()
-        self.bus.add_signal_watch()
-        self.bus.connect('message', self.on_message)
+        self.bus_watcher.attach(self.bus)
 
     def run(self, *args):
         logger.info("Starting pipeline {0}".format(self.pipeline.get_name()))
         self.launch_event("sos", self.pipeline)
-        self.pipeline.set_state(Gst.State.PLAYING)
+        self.set_state(Gst.State.PLAYING)
         # Returning false if it was called by a gobject.timeout
         return False
 
@@ -112,18 +476,84 @@ class PipelineManager(easyevent.User):
 
     def pause(self, *args):
         logger.info("Pausing pipeline")
-        self.pipeline.set_state(Gst.State.PAUSED)
+        self.set_state(Gst.State.PAUSED)
 
     def stop(self, *args):
         if hasattr(self, 'pipeline'):
             logger.info("Stopping pipeline {0}".format(self.pipeline.get_name()))
-            self.pipeline.set_state(Gst.State.NULL)
+            self.set_state(Gst.State.NULL)
         else:
             logger.error('Cannot stop non-running pipeline')
 
+    def close(self):
+        """
+        Stops the pipeline and releases it, along with its bus watch, pollings,
+        seeks and monitors; the manager cannot be used afterwards
+        """
+        self.cancel_swap()
+        self.deactivate_pollings()
+        self.seeker.cancel()
+        self.stop_profiling()
+        self.stop_queue_monitor()
+        self.stop_caps_tracking()
+        if hasattr(self, 'pipeline'):
+            self.set_state(Gst.State.NULL)
+            del self.pipeline
+        self.bus_watcher.close()
+        self.bus = None
+        self.elements_by_name = {}
+        self._graph_cache = {}
+
+    def set_state(self, state):
+        self.state.set_target(state)
+        result = self.pipeline.set_state(state)
+        if state == Gst.State.NULL:
+            # no state-changed message is posted once the bus is flushed, and the ones
+            # of the transitions to NULL may still be queued to the main loop
+            self._new_state_generation()
+            self._on_state_changed(self.state.current, Gst.State.NULL, Gst.State.VOID_PENDING)
+        return result
+
     def get_state(self, *args):
-        state = self.pipeline.get_state(Gst.CLOCK_TIME_NONE)[1]
-        return state.value_name
+        """
+        Returns the name of the last reported pipeline state, without blocking
+        """
+        return self.state.current.value_name
+
+    def wait_for_state(self, state, callback, timeout_ms=None):
+        """
+        Calls callback(state) once the pipeline reaches the given state,
+        or callback(None) if it did not within timeout_ms
+        """
+        if self.state.current == state:
+            callback(state)
+            return
+        waiter = [state, callback, None]
+        if timeout_ms is not None:
+            waiter[2] = GObject.timeout_add(timeout_ms, self._on_state_wait_timeout, waiter)
+        self._state_waiters.append(waiter)
+
+    def _on_state_wait_timeout(self, waiter):
+        if waiter in self._state_waiters:
+            self._state_waiters.remove(waiter)
+            waiter[1](None)
+        return False
+
+    def _new_state_generation(self):
+        """
+        Makes the state-changed messages created so far obsolete: message sequence
+        numbers increase, so those queued to the main loop are recognized and dropped
+        """
+        self._state_seqnum = Gst.util_seqnum_next()
+
+    def _on_state_changed(self, old, new, pending):
+        self.state.update(old, new, pending)
+        if self._state_waiters:
+            for waiter in [waiter for waiter in self._state_waiters if waiter[0] == new]:
+                self._state_waiters.remove(waiter)
+                if waiter[2] is not None:
+                    GObject.source_remove(waiter[2])
+                waiter[1](new)
 
     def get_position(self, *args):
         try:
@@ -151,7 +581,13 @@ class PipelineManager(easyevent.User):
 
     def seek_seconds(self, widget, getter):
         logger.info("Trying to seek to {0}".format(getter()))
-        self.pipeline.seek_simple(Gst.Format.TIME, Gst.SeekFlags.FLUSH, getter() * 1000000000)
+        self.seek(getter())
+
+    def seek(self, position, mode='default', rate=1.0, segment=False, trick_mode=False, flush=True):
+        """
+        Debounced seek to position (in seconds), see Seeker.seek
+        """
+        self.seeker.seek(position, mode, rate, segment, trick_mode, flush)
 
     def send_eos(self, *args):
         logger.info("Sending EOS")
@@ -160,63 +596,225 @@ class PipelineManager(easyevent.User):
 
     def set_caps(self, caps_name="capsfilter", caps=None):
         logger.info("Setting caps {0} on capsfilter named {1}".format(caps, caps_name))
-        capsfilter = self.pipeline.get_by_name(caps_name)
+        capsfilter = self.get_element(caps_name)
         GstCaps = Gst.caps_from_string(caps)
         capsfilter.set_property("caps", GstCaps)
 
     def set_property_on_element(self, element_name="whatever", property_name="property", value="value"):
         logger.debug("Setting value {0} to property {1} of element {2}" .format(value, property_name, element_name))
-        elt = self.pipeline.get_by_name(element_name)
-        elt.set_property(property_name, value)
+        elt = self.get_element(element_name)
+        elt.set_property(property_name, self.coerce_value(self.get_pspec(elt, property_name), value))
 
     def get_property_on_element(self, element_name="whatever", property_name="property"):
-        elt = self.pipeline.get_by_name(element_name)
+        elt = self.get_element(element_name)
         result = elt.get_property(property_name)
         logger.debug("Getting value of property {0} of element {1}: {2}".format(property_name, element_name, result))
         return result
 
     def activate_caps_reporting_on_element(self, element_name="whatever"):
         logger.debug("Activating caps reporting on element {0}".format(element_name))
-        elt = self.pipeline.get_by_name(element_name)
-        out_pad = elt.get_pad("src")
-        out_pad.set_setcaps_function(self.send_caps)
-
-    def activate_polling_of_property_on_element(self, element_name="whatever", property="property", interval_ms=1000):
-        GObject.timeout_add(interval_ms, self.poll_property, element_name, property)
-        self.do_poll = True
+        from .gstcaps import add_caps_probe
+        elt = self.get_element(element_name)
+        for out_pad in elt.srcpads:
+            add_caps_probe(out_pad, self.send_caps)
+
+    def activate_polling_of_property_on_element(self, element_name="whatever", property="property", interval_ms=1000, only_changes=True):
+        """
+        Launches a <property>_value_change event with the property value every interval_ms,
+        or only when the value changed if only_changes is set
+        Returns a handle whose cancel() method stops this polling
+        """
+        return self.poller.add(element_name, property, interval_ms, self._on_polled_value, only_changes)
 
     def deactivate_pollings(self):
-        self.do_poll = False
+        self.poller.clear()
+
+    def _on_polled_value(self, watch, value):
+        self.launch_event("{0}_value_change".format(watch.property), {"source": watch.element_name, "property": watch.property, "value": value})
 
     def poll_property(self, element_name, property):
         value = self.get_property_on_element(element_name, property)
         self.launch_event("{0}_value_change".format(property), {"source": element_name, "property": property, "value": value})
-        return self.do_poll
 
     def send_caps(self, pad, caps):
+        # called from streaming threads
         logger.debug("Got negociated caps")
         caps_str = caps.to_string()
-        self.launch_event("caps", caps_str)
+        self.launch_event_from_bus("caps", caps_str)
         return True
 
+    def start_caps_tracking(self, history=10, max_renegotiations=3, window=10.0):
+        """
+        Records the caps negotiated on every pad, see CapsTracker
+        """
+        from .gstcaps import CapsTracker
+        self.stop_caps_tracking()
+        self.caps_tracker = CapsTracker(self, history, max_renegotiations, window).start()
+        return self.caps_tracker
+
+    def stop_caps_tracking(self):
+        if self.caps_tracker is not None:
+            self.caps_tracker.stop()
+            self.caps_tracker = None
+
+    def get_qos_stats(self):
+        """
+        Returns the QoS statistics per element, see QosCollector.report
+        """
+        return self.qos.report()
+
+    def reset_qos_stats(self):
+        self.qos.reset()
+
     def on_message(self, bus, message):
-        t = message.type
-        if t == Gst.MessageType.ERROR:
-            err, debug = message.parse_error()
-            error_string = "{0} {1}".format(err, debug)
-            logger.info("Error: {0}".format(error_string))
-            self.launch_event("gst_error", error_string)
-        elif t == Gst.MessageType.EOS:
-            self.launch_event("eos", self.pipeline.get_name())
-        elif t == Gst.MessageType.ELEMENT:
-            name = message.get_structure().get_name()
-            res = message.get_structure()
+        self.bus_watcher.dispatch(bus, message)
+
+    def on_error_message(self, bus, message):
+        err, debug = message.parse_error()
+        error_string = "{0} {1}".format(err, debug)
+        logger.info("Error: {0}".format(error_string))
+        self.launch_event("gst_error", error_string)
+
+    def on_eos_message(self, bus, message):
+        self.launch_event("eos", self.pipeline.get_name())
+
+    def on_state_changed_message(self, bus, message):
+        # called from the bus thread, only the pipeline state changes are passed to the main loop
+        if message.src == self.pipeline:
+            GLib.idle_add(self._on_state_changed_once, message.get_seqnum(), *message.parse_state_changed())
+
+    def _on_state_changed_once(self, seqnum, old, new, pending):
+        if Gst.util_seqnum_compare(seqnum, self._state_seqnum) < 0:
+            logger.debug("Dropping obsolete state change to {0}".format(new.value_nick))
+            return False
+        self._on_state_changed(old, new, pending)
+        return False
+
+    def on_element_message(self, bus, message):
+        # called from the bus thread
+        res = message.get_structure()
+        name = res.get_name()
+        has_name_listeners = self.has_listeners(name)
+        if has_name_listeners or self.has_listeners('gst_element_message'):
             source = message.src.get_name()  # (str(message.src)).split(":")[2].split(" ")[0]
-            self.launch_event(name, {"source": source, "data": res})
-            self.launch_event('gst_element_message', {"source": source, "name": name, "data": res})
+            if has_name_listeners:
+                self.launch_event_from_bus(name, {"source": source, "data": res})
+            self.launch_event_from_bus('gst_element_message', {"source": source, "name": name, "data": res})
+
+    def launch_event_from_bus(self, event_type, content):
+        """
+        Launches an event from the bus thread; with the synchronous event dispatcher,
+        the event is launched from the main loop so that listeners may update the UI
+        """
+        if easyevent.dispatcher == 'callback':
+            GLib.idle_add(self._launch_event_once, event_type, content)
         else:
-            if self.send_debug:
-                logger.debug("got unhandled message type {0}, structure {1}".format(t, message))
+            self.launch_event(event_type, content)
+
+    def _launch_event_once(self, event_type, content):
+        self.launch_event(event_type, content)
+        return False
+
+    def get_graph_fingerprint(self, details=GRAPH_DETAILS):
+        """
+        Hash of the pipeline topology (elements, links) and negotiated caps,
+        and of the element states if details include them
+        """
+        with_states = bool(details & Gst.DebugGraphDetails.STATES)
+        digest = hashlib.sha1()
+        iterator = self.pipeline.iterate_recurse()
+        while True:
+            result, element = iterator.next()
+            if result == Gst.IteratorResult.RESYNC:
+                digest = hashlib.sha1()
+                iterator.resync()
+                continue
+            elif result != Gst.IteratorResult.OK:
+                break
+            digest.update(element.get_path_string().encode())
+            if with_states:
+                # current and pending states, as drawn by the dot export, without blocking
+                state_return, current, pending = element.get_state(0)
+                digest.update("@{0}/{1}".format(int(current), int(pending)).encode())
+            for pad in element.pads:
+                peer = pad.get_peer()
+                caps = pad.get_current_caps()
+                digest.update("|{0}>{1}:{2}".format(pad.get_name(), peer.get_path_string() if peer is not None else "", caps.to_string() if caps is not None else "").encode())
+            digest.update(b"\n")
+        return digest.hexdigest()
+
+    def _get_graph_cache_key(self, details, format, force):
+        # property values are not part of the fingerprint, graphs showing them are not cached
+        if force or details & UNCACHED_GRAPH_DETAILS:
+            return None
+        return (self.get_graph_fingerprint(details), int(details), format)
+
+    def get_dot_data(self, details=GRAPH_DETAILS, force=False):
+        """
+        Returns the pipeline graph in dot format, regenerated only when the
+        topology, caps or (if drawn) states changed, or if force is set;
+        graphs with property values are always regenerated
+        """
+        return self._get_dot_data(details, self._get_graph_cache_key(details, 'dot', force))
+
+    def _get_dot_data(self, details, key):
+        data = self._graph_cache.get(key) if key is not None else None
+        if data is None:
+            data = Gst.debug_bin_to_dot_data(self.pipeline, details)
+            if key is not None:
+                self._graph_cache = {key: data}
+        return data
+
+    def render_graph(self, format='svg', details=GRAPH_DETAILS, force=False):
+        """
+        Renders the pipeline graph with the graphviz dot command (svg, png, ...)
+        Returns the rendered bytes, or None if dot failed
+        """
+        dot_key = self._get_graph_cache_key(details, 'dot', force)
+        key = dot_key[:2] + (format,) if dot_key is not None else None
+        data = self._graph_cache.get(key) if key is not None else None
+        if data is None:
+            dot_data = self._get_dot_data(details, dot_key)
+            try:
+                data = subprocess.run(['dot', '-T{0}'.format(format)], input=dot_data.encode(), stdout=subprocess.PIPE, check=True).stdout
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.error('Could not render pipeline graph: {0}'.format(e))
+                return None
+            if key is not None:
+                self._graph_cache[key] = data
+        return data
+
+    def start_profiling(self, sample_every=16, window_ms=None, period_ms=None):
+        """
+        Installs buffer probes on every element to find the bottleneck,
+        for window_ms out of every period_ms if given,
+        see stop_profiling and BottleneckFinder.report
+        """
+        from .gstprofiler import BottleneckFinder
+        self.stop_profiling()
+        self.profiler = BottleneckFinder(self.pipeline, sample_every, window_ms, period_ms).start()
+        return self.profiler
+
+    def stop_profiling(self):
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.stop()
+            self.profiler = None
+        return profiler
+
+    def start_queue_monitor(self, interval_ms=100, history=100, full_threshold=0.9, sustain=5):
+        """
+        Samples the fill levels of all queues, see QueueMonitor
+        """
+        from .gstqueues import QueueMonitor
+        self.stop_queue_monitor()
+        self.queue_monitor = QueueMonitor(self.pipeline, interval_ms, history, full_threshold, sustain).start()
+        return self.queue_monitor
+
+    def stop_queue_monitor(self):
+        if self.queue_monitor is not None:
+            self.queue_monitor.stop()
+            self.queue_monitor = None
 
     def dump_dot_file(self, basename='pipeline'):
         directory = os.environ.get('GST_DEBUG_DUMP_DOT_DIR', os.getcwd())
@@ -261,4 +859,4 @@ if __name__ == '__main__':
 
     pipelinel = PipelineManager(pipeline_desc)
     pipelinel.run()
-    Gtk.main()
+    GLib.MainLoop().run()
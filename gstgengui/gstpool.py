@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# * This Program is free software; you can redistribute it and/or
+# * modify it under the terms of the GNU Lesser General Public
+# * License as published by the Free Software Foundation; either
+# * version 2.1 of the License, or (at your option) any later version.
+# *
+# * Libav is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# * Lesser General Public License for more details.
+# *
+# * You should have received a copy of the GNU Lesser General Public
+# * License along with Libav; if not, write to the Free Software
+# * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Gstpool: runs several instances of a pipeline description
+
+Instances are built from a description template where $index, $name and
+any given substitution key are replaced, e.g.
+"videotestsrc pattern=$pattern ! fakesink name=sink$index"
+
+Copyright 2013, Dirk Van Haerenborgh, under the terms of LGPL
+
+"""
+__author__ = ("Florent Thiery <fthiery@gmail.com>", "Dirk Van Haerenborgh <vhdirk@gmail.com>")
+
+import time
+import logging
+import collections
+from string import Template
+
+logger = logging.getLogger('Gstpool')
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from .gstmanager import PipelineManager, easyevent
+from .gstbus import BusDispatcher
+
+
+class PipelinePool(easyevent.User):
+    def __init__(self, template, count=1, substitutions=None, name="pipeline"):
+        """
+        substitutions maps keys to lists of values, instance i using value i modulo the list length
+        """
+        easyevent.User.__init__(self)
+        self.template = template
+        self.substitutions = substitutions or {}
+        self.name = name
+        self.managers = []
+        self.errors = collections.defaultdict(list)
+        self.eos = set()
+        self.buffer_counts = collections.Counter()
+        self.started = None
+        self.throughput_enabled = False
+        # one thread dispatches the bus messages of every instance
+        self.bus_dispatcher = BusDispatcher("bus-{0}".format(name))
+        self.register_event('gst_error', 'eos')
+        for i in range(count):
+            self.add_instance()
+
+    def get_description(self, index):
+        values = dict((key, values[index % len(values)]) for key, values in self.substitutions.items())
+        values['index'] = index
+        values['name'] = "{0}{1}".format(self.name, index)
+        return Template(self.template).safe_substitute(values)
+
+    def add_instance(self):
+        index = len(self.managers)
+        manager = PipelineManager(self.get_description(index), "{0}{1}".format(self.name, index), self.bus_dispatcher)
+        self.managers.append(manager)
+        return manager
+
+    def select(self, target=None):
+        """
+        Returns the managers matching target: None or 'all' for every instance,
+        an instance index, or an instance name
+        """
+        if target is None or target == 'all':
+            return list(self.managers)
+        if isinstance(target, int) or target.isdigit():
+            index = int(target)
+            return [self.managers[index]] if index < len(self.managers) else []
+        return [manager for manager in self.managers if manager.name == target]
+
+    def _managers_with_pipeline(self, target):
+        return [manager for manager in self.select(target) if hasattr(manager, 'pipeline')]
+
+    def play(self, target=None):
+        if self.started is None:
+            self.started = time.monotonic()
+        for manager in self._managers_with_pipeline(target):
+            manager.run()
+
+    def pause(self, target=None):
+        for manager in self._managers_with_pipeline(target):
+            manager.pause()
+
+    def stop(self, target=None):
+        for manager in self._managers_with_pipeline(target):
+            manager.stop()
+
+    def send_eos(self, target=None):
+        for manager in self._managers_with_pipeline(target):
+            manager.send_eos()
+
+    def set_property(self, element_name, property_name, value, target=None):
+        """
+        Sets the property on the element called element_name in every matching instance having one,
+        returns the managers that were changed
+        """
+        changed = []
+        for manager in self._managers_with_pipeline(target):
+            if manager.get_element(element_name) is None:
+                logger.debug("{0} has no element {1}".format(manager.name, element_name))
+                continue
+            manager.set_property_on_element(element_name, property_name, value)
+            changed.append(manager)
+        return changed
+
+    def seek(self, position, mode='default', rate=1.0, target=None):
+        for manager in self._managers_with_pipeline(target):
+            manager.seek(position, mode, rate)
+
+    def close(self):
+        """
+        Stops every instance and the bus dispatcher thread
+        """
+        for manager in self.managers:
+            manager.close()
+        self.bus_dispatcher.stop()
+
+    def redefine(self, template):
+        """
+        Replaces the pipelines of every instance with the given template and plays them
+        """
+        self.template = template
+        self.eos = set()
+        for index, manager in enumerate(self.managers):
+            if hasattr(manager, 'pipeline'):
+                manager.stop()
+            manager.parse_description(self.get_description(index))
+            if self.throughput_enabled and hasattr(manager, 'pipeline'):
+                self._install_throughput_probes(manager)
+        self.play()
+
+    def enable_throughput(self):
+        """
+        Counts the buffers reaching the sinks of every instance
+        """
+        self.throughput_enabled = True
+        for manager in self._managers_with_pipeline(None):
+            self._install_throughput_probes(manager)
+
+    def _install_throughput_probes(self, manager):
+        iterator = manager.pipeline.iterate_sinks()
+        while True:
+            result, sink = iterator.next()
+            if result != Gst.IteratorResult.OK:
+                break
+            for pad in sink.sinkpads:
+                pad.add_probe(Gst.PadProbeType.BUFFER, self._count_buffer, manager.name)
+
+    def _count_buffer(self, pad, info, name):
+        self.buffer_counts[name] += 1
+        return Gst.PadProbeReturn.OK
+
+    def _is_ours(self, event):
+        return any(manager is event.source for manager in self.managers)
+
+    def evt_gst_error(self, event):
+        if self._is_ours(event):
+            self.errors[event.source.name].append(event.content)
+
+    def evt_eos(self, event):
+        if self._is_ours(event):
+            self.eos.add(event.source.name)
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started if self.started is not None else 0
+        instances = []
+        for manager in self.managers:
+            running = hasattr(manager, 'pipeline')
+            instances.append({
+                "name": manager.name,
+                "state": manager.get_state() if running else None,
+                "errors": len(self.errors[manager.name]),
+                "eos": manager.name in self.eos,
+                "buffers": self.buffer_counts[manager.name],
+            })
+        total_buffers = sum(self.buffer_counts.values())
+        return {
+            "instances": instances,
+            "states": dict(collections.Counter(instance["state"] for instance in instances)),
+            "errors": sum(instance["errors"] for instance in instances),
+            "eos": len(self.eos),
+            "buffers": total_buffers,
+            "buffers_per_second": total_buffers / elapsed if elapsed else 0,
+        }
+
+    def get_summary_string(self):
+        summary = self.summary()
+        states = ", ".join("{0}: {1}".format(state, count) for state, count in sorted(summary["states"].items(), key=str))
+        return "{0} instances ({1}), {2} errors, {3} EOS, {4:.1f} buffers/s".format(len(self.managers), states, summary["errors"], summary["eos"], summary["buffers_per_second"])
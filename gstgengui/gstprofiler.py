@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# * This Program is free software; you can redistribute it and/or
+# * modify it under the terms of the GNU Lesser General Public
+# * License as published by the Free Software Foundation; either
+# * version 2.1 of the License, or (at your option) any later version.
+# *
+# * Libav is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# * Lesser General Public License for more details.
+# *
+# * You should have received a copy of the GNU Lesser General Public
+# * License along with Libav; if not, write to the Free Software
+# * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Gstprofiler: bottleneck finder
+
+Installs buffer probes on the pads of every element to measure its buffer
+rate and the time a buffer takes from its sink pad to its src pad, then
+ranks elements by the estimated fraction of time they spend processing.
+Elements added while running (e.g. the decoders of decodebin) are probed
+as they appear.
+
+Only one buffer out of sample_every is timed, and counters live in lists
+preallocated per element, to keep the probes cheap. With window_ms, probes
+are only attached for window_ms out of every period_ms, and rates are
+computed over the probed time. A sample only counts if the buffer leaves on
+the thread it entered: queues hand buffers over to another thread, so they
+are reported as thread boundaries, with rates only.
+
+Copyright 2013, Dirk Van Haerenborgh, under the terms of LGPL
+
+"""
+__author__ = ("Florent Thiery <fthiery@gmail.com>", "Dirk Van Haerenborgh <vhdirk@gmail.com>")
+
+import time
+import threading
+import logging
+logger = logging.getLogger('Gstprofiler')
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib, Gst
+
+# elements pushing their buffers from another thread than they receive them
+THREAD_BOUNDARY_FACTORIES = ('queue', 'queue2', 'multiqueue')
+
+
+class BottleneckFinder(object):
+    def __init__(self, pipeline, sample_every=16, window_ms=None, period_ms=None):
+        """
+        window_ms, period_ms: probe for window_ms out of every period_ms (from the GLib main loop), or all the time if window_ms is None
+        """
+        self.pipeline = pipeline
+        self.sample_every = sample_every
+        self.window_ms = window_ms
+        self.period_ms = period_ms
+        self.elements = []
+        self._indexes = {}
+        self.buffers_in = []
+        self.buffers_out = []
+        self.process_time = []
+        self.samples = []
+        self._entered = []
+        self.cross_thread = []
+        self.thread_boundary = []
+        # guards the element lists and the probes, elements and pads being added from streaming threads
+        self._lock = threading.RLock()
+        self._probes = []
+        self._pad_added_ids = []
+        self._element_added_id = None
+        self._timeout_id = None
+        # time spent with probes attached, the current window excluded
+        self.probed_time = 0.0
+        self._window_started = None
+        self.started = None
+        self.stopped = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.stopped = None
+        self._element_added_id = self.pipeline.connect('deep-element-added', self._on_element_added)
+        iterator = self.pipeline.iterate_recurse()
+        while True:
+            result, element = iterator.next()
+            if result == Gst.IteratorResult.OK:
+                self._add_element(element)
+            elif result == Gst.IteratorResult.RESYNC:
+                iterator.resync()
+            else:
+                break
+        self._attach()
+        if self.window_ms is not None:
+            self._timeout_id = GLib.timeout_add(self.window_ms, self._on_window_end)
+        return self
+
+    def stop(self):
+        self.stopped = time.perf_counter()
+        if self._timeout_id is not None:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = None
+        if self._element_added_id is not None:
+            self.pipeline.disconnect(self._element_added_id)
+            self._element_added_id = None
+        self._detach()
+
+    def _add_element(self, element):
+        """
+        Grows the per element lists, returns the index of the element or None for bins
+        """
+        if isinstance(element, Gst.Bin):
+            return None
+        with self._lock:
+            index = self._indexes.get(element)
+            if index is not None:
+                return index
+            index = len(self.elements)
+            self.buffers_in.append(0)
+            self.buffers_out.append(0)
+            self.process_time.append(0.0)
+            self.samples.append(0)
+            self._entered.append(None)
+            self.cross_thread.append(0)
+            self.thread_boundary.append(self._get_factory_name(element) in THREAD_BOUNDARY_FACTORIES)
+            # the element is only published once its counters exist
+            self.elements.append(element)
+            self._indexes[element] = index
+            return index
+
+    def _on_element_added(self, pipeline, bin, element):
+        with self._lock:
+            known = element in self._indexes
+            index = self._add_element(element)
+            if index is not None and not known and self._window_started is not None:
+                self._probe_element(element, index)
+
+    def _probe_element(self, element, index):
+        for pad in element.pads:
+            self._add_probe(pad, index)
+        # e.g. demuxers and decodebin add pads once running
+        self._pad_added_ids.append((element, element.connect('pad-added', self._on_pad_added, index)))
+
+    def _attach(self):
+        with self._lock:
+            self._window_started = time.perf_counter()
+            for index, element in enumerate(self.elements):
+                self._probe_element(element, index)
+
+    def _detach(self):
+        with self._lock:
+            if self._window_started is None:
+                return
+            self.probed_time += time.perf_counter() - self._window_started
+            self._window_started = None
+            for pad, probe_id in self._probes:
+                pad.remove_probe(probe_id)
+            self._probes = []
+            for element, handler_id in self._pad_added_ids:
+                element.disconnect(handler_id)
+            self._pad_added_ids = []
+            # buffers timed when the window closed will not be seen leaving
+            self._entered[:] = [None] * len(self._entered)
+
+    def _on_window_end(self):
+        self._detach()
+        self._timeout_id = GLib.timeout_add(max(self.period_ms - self.window_ms, 0), self._on_window_start)
+        return False
+
+    def _on_window_start(self):
+        self._attach()
+        self._timeout_id = GLib.timeout_add(self.window_ms, self._on_window_end)
+        return False
+
+    def get_probed_time(self):
+        with self._lock:
+            if self._window_started is None:
+                return self.probed_time
+            return self.probed_time + time.perf_counter() - self._window_started
+
+    def _get_factory_name(self, element):
+        factory = element.get_factory()
+        return factory.get_name() if factory is not None else None
+
+    def _on_pad_added(self, element, pad, index):
+        with self._lock:
+            if self._window_started is not None:
+                self._add_probe(pad, index)
+
+    def _add_probe(self, pad, index):
+        if pad.get_direction() == Gst.PadDirection.SINK:
+            callback = self._on_sink_buffer
+        else:
+            callback = self._on_src_buffer
+        self._probes.append((pad, pad.add_probe(Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST, callback, index)))
+
+    def _get_buffer_count(self, info):
+        if info.type & Gst.PadProbeType.BUFFER_LIST:
+            return info.get_buffer_list().length()
+        return 1
+
+    def _on_sink_buffer(self, pad, info, index):
+        previous = self.buffers_in[index]
+        count = previous + self._get_buffer_count(info)
+        self.buffers_in[index] = count
+        # a buffer list is timed as a whole when it holds the sampled buffer
+        if count // self.sample_every > previous // self.sample_every and not self.thread_boundary[index]:
+            self._entered[index] = (time.perf_counter(), threading.get_ident())
+        return Gst.PadProbeReturn.OK
+
+    def _on_src_buffer(self, pad, info, index):
+        self.buffers_out[index] += self._get_buffer_count(info)
+        entered = self._entered[index]
+        if entered is not None:
+            if entered[1] == threading.get_ident():
+                self._entered[index] = None
+                self.process_time[index] += time.perf_counter() - entered[0]
+                self.samples[index] += 1
+            else:
+                # another buffer leaving from another thread, it says nothing about the time spent on this one
+                self.cross_thread[index] += 1
+        return Gst.PadProbeReturn.OK
+
+    def is_thread_boundary(self, index):
+        """
+        Returns whether the element at index hands its buffers over to another thread,
+        known from its factory or seen from its src probes
+        """
+        return self.thread_boundary[index] or self.cross_thread[index] > self.samples[index]
+
+    def report(self):
+        """
+        Returns per element statistics, the most loaded element first:
+        buffer rates, mean sink to src time, and the estimated busy and idle
+        fractions (only for elements with both sink and src pads which are not
+        thread boundaries)
+        """
+        elapsed = self.get_probed_time()
+        rows = []
+        for index, element in enumerate(list(self.elements)):
+            row = {
+                "element": element.get_name(),
+                "factory": self._get_factory_name(element),
+                "buffers_in": self.buffers_in[index],
+                "buffers_out": self.buffers_out[index],
+                "rate_in": self.buffers_in[index] / elapsed if elapsed else 0,
+                "rate_out": self.buffers_out[index] / elapsed if elapsed else 0,
+                "mean_process_ms": None,
+                "busy": None,
+                "idle": None,
+                "thread_boundary": self.is_thread_boundary(index),
+            }
+            if self.samples[index] and not row["thread_boundary"]:
+                mean = self.process_time[index] / self.samples[index]
+                busy = min(1.0, mean * self.buffers_in[index] / elapsed) if elapsed else 0
+                row.update(mean_process_ms=mean * 1000, busy=busy, idle=1.0 - busy)
+            rows.append(row)
+        rows.sort(key=lambda row: (row["busy"] or 0, row["mean_process_ms"] or 0), reverse=True)
+        return rows
+
+    def format_report(self):
+        lines = ["{0:<24} {1:<16} {2:>10} {3:>10} {4:>10} {5:>6} {6:>6}".format("element", "factory", "in/s", "out/s", "ms/buf", "busy", "idle")]
+        for row in self.report():
+            timed = row["busy"] is not None
+            lines.append("{0:<24} {1:<16} {2:>10.1f} {3:>10.1f} {4:>10} {5:>6} {6:>6}".format(
+                row["element"], row["factory"] or "", row["rate_in"], row["rate_out"],
+                "{0:.3f}".format(row["mean_process_ms"]) if timed else "-",
+                "{0:.0%}".format(row["busy"]) if timed else ("thread" if row["thread_boundary"] else "-"),
+                "{0:.0%}".format(row["idle"]) if timed else "-"))
+        return "\n".join(lines)
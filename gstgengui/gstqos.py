@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# * This Program is free software; you can redistribute it and/or
+# * modify it under the terms of the GNU Lesser General Public
+# * License as published by the Free Software Foundation; either
+# * version 2.1 of the License, or (at your option) any later version.
+# *
+# * Libav is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# * Lesser General Public License for more details.
+# *
+# * You should have received a copy of the GNU Lesser General Public
+# * License along with Libav; if not, write to the Free Software
+# * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Gstqos: QoS statistics
+
+Aggregates the QOS messages posted by sinks and filters into running
+statistics per element: processed and dropped buffer counts, jitter,
+proportion, and lateness percentiles estimated from a fixed histogram,
+so that memory use does not grow with the number of messages.
+
+Copyright 2013, Dirk Van Haerenborgh, under the terms of LGPL
+
+"""
+__author__ = ("Florent Thiery <fthiery@gmail.com>", "Dirk Van Haerenborgh <vhdirk@gmail.com>")
+
+import bisect
+import threading
+import logging
+logger = logging.getLogger('Gstqos')
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+# upper bounds in milliseconds of the lateness histogram buckets, the last bucket holds later buffers
+LATENESS_BOUNDS_MS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+PERCENTILES = (50, 90, 99)
+
+
+class QosStats(object):
+    __slots__ = ('source', 'messages', 'processed', 'dropped', 'jitter_total', 'jitter_max',
+                 'proportion', 'proportion_min', 'histogram', 'live', 'last_timestamp')
+
+    def __init__(self, source):
+        self.source = source
+        self.messages = 0
+        self.processed = 0
+        self.dropped = 0
+        self.jitter_total = 0
+        self.jitter_max = None
+        self.proportion = None
+        self.proportion_min = None
+        self.histogram = [0] * (len(LATENESS_BOUNDS_MS) + 1)
+        self.live = False
+        self.last_timestamp = None
+
+    def add(self, message):
+        live, running_time, stream_time, timestamp, duration = message.parse_qos()
+        jitter, proportion, quality = message.parse_qos_values()
+        format, processed, dropped = message.parse_qos_stats()
+        self.messages += 1
+        self.live = live
+        self.last_timestamp = timestamp
+        # processed and dropped are running totals kept by the element, -1 when unknown
+        if processed >= 0:
+            self.processed = processed
+        if dropped >= 0:
+            self.dropped = dropped
+        self.jitter_total += jitter
+        if self.jitter_max is None or jitter > self.jitter_max:
+            self.jitter_max = jitter
+        self.proportion = proportion
+        if self.proportion_min is None or proportion < self.proportion_min:
+            self.proportion_min = proportion
+        # a positive jitter is the lateness of the buffer
+        self.histogram[bisect.bisect_left(LATENESS_BOUNDS_MS, max(jitter, 0) / Gst.MSECOND)] += 1
+
+    def percentile(self, percent):
+        """
+        Returns the upper bound in ms of the histogram bucket holding the given percentile
+        of lateness, or None for the last bucket
+        """
+        target = self.messages * percent / 100.0
+        count = 0
+        for bound, bucket in zip(LATENESS_BOUNDS_MS, self.histogram):
+            count += bucket
+            if count >= target:
+                return bound
+        return None
+
+    @property
+    def drop_ratio(self):
+        total = self.processed + self.dropped
+        return self.dropped / total if total else 0.0
+
+    def summary(self):
+        return {
+            "source": self.source,
+            "messages": self.messages,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "drop_ratio": self.drop_ratio,
+            "jitter_mean_ms": self.jitter_total / self.messages / Gst.MSECOND if self.messages else 0.0,
+            "jitter_max_ms": self.jitter_max / Gst.MSECOND if self.jitter_max is not None else None,
+            "proportion": self.proportion,
+            "proportion_min": self.proportion_min,
+            "lateness_ms": dict(("p{0}".format(percent), self.percentile(percent)) for percent in PERCENTILES),
+            "live": self.live,
+        }
+
+
+class QosCollector(object):
+    def __init__(self, manager):
+        self.manager = manager
+        self.elements = {}
+        self._lock = threading.Lock()
+
+    def on_qos_message(self, bus, message):
+        # called from the bus thread
+        source = message.src.get_path_string()
+        with self._lock:
+            stats = self.elements.get(source)
+            if stats is None:
+                stats = self.elements[source] = QosStats(source)
+            dropped = stats.dropped
+            stats.add(message)
+            summary = stats.summary() if self.manager.has_listeners('qos') else None
+        if stats.dropped > dropped:
+            logger.debug("{0} dropped {1} buffers".format(source, stats.dropped - dropped))
+        if summary is not None:
+            self.manager.launch_event_from_bus('qos', summary)
+
+    def reset(self):
+        with self._lock:
+            self.elements = {}
+
+    def report(self):
+        """
+        Returns the QoS statistics per element, the elements dropping most buffers first
+        """
+        with self._lock:
+            rows = [stats.summary() for stats in self.elements.values()]
+        rows.sort(key=lambda row: (row["dropped"], row["jitter_mean_ms"]), reverse=True)
+        return rows
+
+    def format_summary(self):
+        """
+        Returns a one line summary of the element dropping most buffers
+        """
+        rows = self.report()
+        if not rows:
+            return "QoS: no messages"
+        worst = rows[0]
+        p90 = worst["lateness_ms"]["p90"]
+        return "QoS: {0} dropped {1} ({2:.1%}), p90 lateness {3} ms".format(
+            worst["source"].rsplit('/', 1)[-1], worst["dropped"], worst["drop_ratio"],
+            p90 if p90 is not None else ">{0}".format(LATENESS_BOUNDS_MS[-1]))
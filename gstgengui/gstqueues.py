@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# * This Program is free software; you can redistribute it and/or
+# * modify it under the terms of the GNU Lesser General Public
+# * License as published by the Free Software Foundation; either
+# * version 2.1 of the License, or (at your option) any later version.
+# *
+# * Libav is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# * Lesser General Public License for more details.
+# *
+# * You should have received a copy of the GNU Lesser General Public
+# * License along with Libav; if not, write to the Free Software
+# * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Gstqueues: queue fill level monitor
+
+Samples the levels of every queue, queue2 and multiqueue of a pipeline
+from a single timeout, keeps a short history per queue, and launches
+queue_full / queue_empty / queue_normal events when a queue stays full
+or empty for several samples. Queues added to the pipeline while it runs
+(e.g. by decodebin) and new multiqueue pads are monitored as they appear.
+
+Copyright 2013, Dirk Van Haerenborgh, under the terms of LGPL
+
+"""
+__author__ = ("Florent Thiery <fthiery@gmail.com>", "Dirk Van Haerenborgh <vhdirk@gmail.com>")
+
+import collections
+import logging
+logger = logging.getLogger('Gstqueues')
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import GObject, Gst
+
+from .gstintrospector import PipelineIntrospector
+
+try:
+    import easyevent
+except Exception:
+    from . import event as easyevent
+
+QUEUE_FACTORIES = ('queue', 'queue2', 'multiqueue')
+
+LEVELS = ('buffers', 'bytes', 'time')
+
+
+class MonitoredQueue(object):
+    """
+    A queue, or a single queue of a multiqueue (whose levels are pad properties)
+    """
+    def __init__(self, name, element, level_object, limits_object, history):
+        self.name = name
+        self.element = element
+        self.level_object = level_object
+        self.limits = dict((level, limits_object.get_property('max-size-{0}'.format(level))) for level in LEVELS)
+        self.history = collections.deque(maxlen=history)
+        self.levels = None
+        self.state = 'normal'
+        self.full_count = 0
+        self.empty_count = 0
+
+    def sample(self):
+        self.levels = levels = dict((level, self.level_object.get_property('current-level-{0}'.format(level))) for level in LEVELS)
+        fill = 0.0
+        for level in LEVELS:
+            if self.limits[level]:
+                fill = max(fill, levels[level] / self.limits[level])
+        self.history.append(fill)
+        return fill
+
+    @property
+    def is_empty(self):
+        # from the levels rather than the fill, which stays at 0 for queues without limits
+        return self.levels is not None and not any(self.levels.values())
+
+
+class QueueMonitor(easyevent.Launcher):
+    def __init__(self, pipeline, interval_ms=100, history=100, full_threshold=0.9, sustain=5):
+        """
+        A queue is reported full (or empty) when its fill level stays above
+        full_threshold (or at 0) for sustain consecutive samples
+        """
+        easyevent.Launcher.__init__(self)
+        self.pipeline = pipeline
+        self.interval_ms = interval_ms
+        self.history = history
+        self.full_threshold = full_threshold
+        self.sustain = sustain
+        # only changed from the main loop, elements and pads being added from streaming threads
+        self.queues = []
+        self.source_id = None
+        # (object, handler id), disconnected by stop
+        self._handler_ids = [
+            (pipeline, pipeline.connect('deep-element-added', self._on_element_added)),
+            (pipeline, pipeline.connect('deep-element-removed', self._on_element_removed)),
+        ]
+        introspector = PipelineIntrospector(pipeline, introspect=False)
+        for element in introspector.get_elements_by_factory(*QUEUE_FACTORIES):
+            self.add_queue_element(element)
+        logger.debug("Monitoring {0} queues".format(len(self.queues)))
+
+    def start(self):
+        if self.source_id is None:
+            self.source_id = GObject.timeout_add(self.interval_ms, self.sample)
+        return self
+
+    def stop(self):
+        """
+        Stops sampling and following the elements added to the pipeline
+        """
+        if self.source_id is not None:
+            GObject.source_remove(self.source_id)
+            self.source_id = None
+        for gobject, handler_id in self._handler_ids:
+            gobject.disconnect(handler_id)
+        self._handler_ids = []
+
+    def _get_factory_name(self, element):
+        factory = element.get_factory()
+        return factory.get_name() if factory is not None else None
+
+    def _is_monitored(self, level_object):
+        return any(queue.level_object is level_object for queue in self.queues)
+
+    def add_queue_element(self, element):
+        name = element.get_name()
+        if self._get_factory_name(element) == 'multiqueue':
+            for pad in element.sinkpads:
+                self.add_multiqueue_pad(element, pad)
+            # request pads are added as streams are linked
+            self._handler_ids.append((element, element.connect('pad-added', self._on_pad_added)))
+        elif not self._is_monitored(element):
+            self.queues.append(MonitoredQueue(name, element, element, element, self.history))
+        return False
+
+    def add_multiqueue_pad(self, element, pad):
+        if pad.get_direction() == Gst.PadDirection.SINK and pad.find_property('current-level-buffers') is not None and not self._is_monitored(pad):
+            self.queues.append(MonitoredQueue('{0}:{1}'.format(element.get_name(), pad.get_name()), element, pad, element, self.history))
+        return False
+
+    def remove_queue_element(self, element):
+        self.queues = [queue for queue in self.queues if queue.element is not element]
+        return False
+
+    def _on_element_added(self, pipeline, bin, element):
+        if self._get_factory_name(element) in QUEUE_FACTORIES:
+            GObject.idle_add(self.add_queue_element, element)
+
+    def _on_element_removed(self, pipeline, bin, element):
+        if self._get_factory_name(element) in QUEUE_FACTORIES:
+            GObject.idle_add(self.remove_queue_element, element)
+
+    def _on_pad_added(self, element, pad):
+        GObject.idle_add(self.add_multiqueue_pad, element, pad)
+
+    def sample(self):
+        for queue in self.queues:
+            fill = queue.sample()
+            if fill >= self.full_threshold:
+                queue.full_count += 1
+                queue.empty_count = 0
+            elif queue.is_empty:
+                queue.empty_count += 1
+                queue.full_count = 0
+            else:
+                queue.full_count = queue.empty_count = 0
+            if queue.full_count >= self.sustain:
+                state = 'full'
+            elif queue.empty_count >= self.sustain:
+                state = 'empty'
+            elif queue.full_count == queue.empty_count == 0:
+                state = 'normal'
+            else:
+                state = queue.state
+            if state != queue.state:
+                queue.state = state
+                logger.info("Queue {0} is {1} ({2:.0%})".format(queue.name, state, fill))
+                self.launch_event("queue_{0}".format(state), {"source": queue.name, "fill": fill, "levels": queue.levels})
+        return True
+
+    def snapshot(self):
+        return dict((queue.name, {
+            "fill": queue.history[-1] if queue.history else None,
+            "state": queue.state,
+            "levels": queue.levels,
+            "limits": queue.limits,
+            "history": list(queue.history),
+        }) for queue in self.queues)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# * This Program is free software; you can redistribute it and/or
+# * modify it under the terms of the GNU Lesser General Public
+# * License as published by the Free Software Foundation; either
+# * version 2.1 of the License, or (at your option) any later version.
+# *
+# * Libav is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# * Lesser General Public License for more details.
+# *
+# * You should have received a copy of the GNU Lesser General Public
+# * License along with Libav; if not, write to the Free Software
+# * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Gstseek: debounced seeks
+
+Seek requests are rate limited: while a flushing seek is in flight (until
+ASYNC_DONE) or within debounce_ms of the previous one, new requests only
+replace the pending target, so scrubbing issues one seek per debounce
+period instead of flooding the demuxers. The time from each seek to the
+first buffer reaching the sinks is measured and reported in a seek_done event.
+
+Copyright 2013, Dirk Van Haerenborgh, under the terms of LGPL
+
+"""
+__author__ = ("Florent Thiery <fthiery@gmail.com>", "Dirk Van Haerenborgh <vhdirk@gmail.com>")
+
+import time
+import threading
+import collections
+import logging
+logger = logging.getLogger('Gstseek')
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import GObject, Gst
+
+SEEK_MODES = {
+    'default': Gst.SeekFlags.NONE,
+    'accurate': Gst.SeekFlags.ACCURATE,
+    'key_unit': Gst.SeekFlags.KEY_UNIT,
+    'snap_before': Gst.SeekFlags.KEY_UNIT | Gst.SeekFlags.SNAP_BEFORE,
+    'snap_after': Gst.SeekFlags.KEY_UNIT | Gst.SeekFlags.SNAP_AFTER,
+    'snap_nearest': Gst.SeekFlags.KEY_UNIT | Gst.SeekFlags.SNAP_NEAREST,
+}
+
+TRICK_MODES = {
+    False: Gst.SeekFlags.NONE,
+    True: Gst.SeekFlags.TRICKMODE,
+    'key_units': Gst.SeekFlags.TRICKMODE | Gst.SeekFlags.TRICKMODE_KEY_UNITS,
+    'no_audio': Gst.SeekFlags.TRICKMODE | Gst.SeekFlags.TRICKMODE_NO_AUDIO,
+}
+
+
+class SeekRequest(object):
+    def __init__(self, position, mode='default', rate=1.0, segment=False, trick_mode=False, flush=True):
+        self.position = position
+        self.rate = rate
+        self.flags = SEEK_MODES[mode] | TRICK_MODES[trick_mode]
+        if flush:
+            self.flags |= Gst.SeekFlags.FLUSH
+        if segment:
+            self.flags |= Gst.SeekFlags.SEGMENT
+        self.issued_at = None
+        self.first_buffer_at = None
+        self.probes = []
+        # guards probes and first_buffer_at, used from the streaming threads of every sink
+        self.lock = threading.Lock()
+
+
+class Seeker(object):
+    # an in-flight seek not completed after this delay no longer holds back the next one
+    IN_FLIGHT_TIMEOUT_MS = 1000
+    # number of seek latencies kept
+    LATENCY_HISTORY = 100
+
+    def __init__(self, manager, debounce_ms=50):
+        self.manager = manager
+        self.debounce_ms = debounce_ms
+        self.pending = None
+        self.in_flight = None
+        self.last_issue = None
+        self.source_id = None
+        # the request whose first buffer probes may still be installed
+        self.watched = None
+        self.latencies = collections.deque(maxlen=self.LATENCY_HISTORY)
+        manager.bus_watcher.add_handler(Gst.MessageType.ASYNC_DONE, self.on_async_done, main_loop=True)
+
+    def seek(self, position, mode='default', rate=1.0, segment=False, trick_mode=False, flush=True):
+        """
+        Requests a seek to position (in seconds); mode is one of SEEK_MODES,
+        trick_mode one of TRICK_MODES, and a negative rate plays backwards
+        from position
+        """
+        self.pending = SeekRequest(position, mode, rate, segment, trick_mode, flush)
+        self._schedule()
+
+    def _schedule(self):
+        if self.source_id is not None or self.pending is None:
+            return
+        now = time.monotonic()
+        if self.in_flight is not None:
+            wait_ms = self.IN_FLIGHT_TIMEOUT_MS - (now - self.in_flight.issued_at) * 1000
+        elif self.last_issue is not None:
+            wait_ms = self.debounce_ms - (now - self.last_issue) * 1000
+        else:
+            wait_ms = 0
+        if wait_ms <= 0:
+            self._issue()
+        else:
+            self.source_id = GObject.timeout_add(int(wait_ms) + 1, self._on_timeout)
+
+    def _on_timeout(self):
+        self.source_id = None
+        if self.in_flight is not None and (time.monotonic() - self.in_flight.issued_at) * 1000 >= self.IN_FLIGHT_TIMEOUT_MS:
+            logger.debug("Seek to {0} did not complete, issuing the next one".format(self.in_flight.position))
+            self._remove_probes(self.in_flight)
+            self.in_flight = None
+        self._schedule()
+        return False
+
+    def cancel(self):
+        """
+        Drops the pending seek and the probes of the last one
+        """
+        self.pending = None
+        self.in_flight = None
+        if self.source_id is not None:
+            GObject.source_remove(self.source_id)
+            self.source_id = None
+        if self.watched is not None:
+            self._remove_probes(self.watched)
+            self.watched = None
+
+    def on_async_done(self, bus, message):
+        if message.src != self.manager.pipeline or self.in_flight is None:
+            return
+        self.in_flight = None
+        if self.source_id is not None:
+            GObject.source_remove(self.source_id)
+            self.source_id = None
+        self._schedule()
+
+    def _issue(self):
+        request, self.pending = self.pending, None
+        pipeline = self.manager.pipeline
+        position = int(round(request.position * Gst.SECOND))
+        if request.rate >= 0:
+            start_type, start, stop_type, stop = Gst.SeekType.SET, position, Gst.SeekType.NONE, Gst.CLOCK_TIME_NONE
+        else:
+            start_type, start, stop_type, stop = Gst.SeekType.SET, 0, Gst.SeekType.SET, position
+        request.issued_at = self.last_issue = time.monotonic()
+        # the previous request's first buffer, if it is still to come, would be that of this seek
+        if self.watched is not None:
+            self._remove_probes(self.watched)
+        self.watched = request
+        self._watch_first_buffer(pipeline, request)
+        logger.info("Seeking to {0} s (rate {1}, flags {2})".format(request.position, request.rate, request.flags))
+        if not pipeline.seek(request.rate, Gst.Format.TIME, request.flags, start_type, start, stop_type, stop):
+            logger.error("Seek to {0} s failed".format(request.position))
+            self._remove_probes(request)
+            return
+        if request.flags & Gst.SeekFlags.FLUSH:
+            self.in_flight = request
+        self._schedule()
+
+    def _watch_first_buffer(self, pipeline, request):
+        # installed before seeking, as flushing seeks may flush the sinks before pipeline.seek returns;
+        # buffers are only taken into account after the new segment (after the flush for flushing seeks)
+        flushing = bool(request.flags & Gst.SeekFlags.FLUSH)
+        iterator = pipeline.iterate_sinks()
+        while True:
+            result, sink = iterator.next()
+            if result != Gst.IteratorResult.OK:
+                break
+            for pad in sink.sinkpads:
+                probe_id = pad.add_probe(Gst.PadProbeType.BUFFER | Gst.PadProbeType.EVENT_DOWNSTREAM | Gst.PadProbeType.EVENT_FLUSH,
+                                         self._on_sink_data, request, [flushing, True])
+                with request.lock:
+                    request.probes.append((pad, probe_id))
+
+    def _remove_probes(self, request):
+        with request.lock:
+            probes, request.probes = request.probes, []
+        for pad, probe_id in probes:
+            pad.remove_probe(probe_id)
+
+    def _on_sink_data(self, pad, info, request, waiting):
+        # waiting: [for the flush to stop, for the new segment]
+        if info.type & (Gst.PadProbeType.EVENT_DOWNSTREAM | Gst.PadProbeType.EVENT_FLUSH):
+            event_type = info.get_event().type
+            if event_type == Gst.EventType.FLUSH_STOP:
+                waiting[0] = False
+            elif event_type == Gst.EventType.SEGMENT and not waiting[0]:
+                waiting[1] = False
+            return Gst.PadProbeReturn.OK
+        if waiting[0] or waiting[1]:
+            return Gst.PadProbeReturn.OK
+        with request.lock:
+            # the probe removes itself, it must not be removed again by _remove_probes
+            if (pad, info.id) in request.probes:
+                request.probes.remove((pad, info.id))
+            first = request.first_buffer_at is None
+            if first:
+                request.first_buffer_at = time.monotonic()
+        if first:
+            latency = request.first_buffer_at - request.issued_at
+            self.latencies.append(latency)
+            logger.debug("First buffer {0:.1f} ms after seeking to {1} s".format(latency * 1000, request.position))
+            self.manager.launch_event_from_bus("seek_done", {"source": self.manager.get_name(), "position": request.position, "rate": request.rate, "latency": latency})
+        return Gst.PadProbeReturn.REMOVE
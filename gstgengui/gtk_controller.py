@@ -28,7 +28,7 @@ __author__ = ("Florent Thiery <fthiery@gmail.com>", "Dirk Van Haerenborgh <vhdir
 import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import GLib, GObject, Gst, Gio, Gtk
-from gi.repository import Gdk, GdkX11, GstVideo
+# Gdk, GdkX11 and GstVideo are loaded with the first video preview
 
 import logging
 logger = logging.getLogger('gtk-gstgengui')
@@ -68,20 +68,28 @@ class GtkGstController(object):
         logger.info("destroy signal occurred")
         Gtk.main_quit()
 
-    def __init__(self, pipeline_launcher, show_messages=False, display_preview=True, ignore_list=[]):
+    def __init__(self, pipeline_launcher, show_messages=False, display_preview=True, ignore_list=[], standby_refresh=False, pool=None):
         self.prop_watchlist = list()
 
         self.pipeline_launcher = pipeline_launcher
+        # when set, pipeline controls act on every instance of the pool
+        self.pool = pool
         self.ignore_list = ignore_list
+        # preroll refreshed pipelines while the current one keeps running
+        self.standby_refresh = standby_refresh
         
         self.prop_list = list()
+        # Element -> expander of its properties
+        self.element_widgets = {}
+        self.introspector = None
         
         if show_messages:
             self._on_show_messages()
 
-        self.pipeline_launcher.bus.enable_sync_message_emission()
-        self.pipeline_launcher.bus.connect('sync-message::element', self.on_sync_message)
-        self.pipeline_launcher.bus.connect('message::state-changed', self.on_state_change_message)
+        # registered once, the pipeline manager keeps them across refreshes
+        bus_watcher = self.pipeline_launcher.bus_watcher
+        bus_watcher.add_sync_handler('element', self.on_sync_message)
+        bus_watcher.add_handler(Gst.MessageType.STATE_CHANGED, self.on_state_change_message)
 
         self.poll_id = None
 
@@ -129,11 +137,16 @@ class GtkGstController(object):
             self._create_videowidget(message)
             
     def on_state_change_message(self, bus, message):
+        # called from the bus thread
+        if message.src != self.pipeline_launcher.pipeline:
+            return
         for prop, widget in self.prop_list:
             GObject.idle_add(self.update_widget_value, widget, prop)
         
 
     def _create_videowidget(self, message):
+        # GdkX11 provides get_xid, GstVideo the VideoOverlay interface of the sink
+        from gi.repository import Gdk, GdkX11, GstVideo
         videowidget = None
         videowidget = VideoWidget()
         videowidget.show()
@@ -153,7 +166,8 @@ class GtkGstController(object):
         entry.set_size_request(400,50)
         #entry.set_wrap_mode(Gtk.WRAP_CHAR) #XXX
         self.textbuffer = textbuffer = entry.get_buffer()
-        textbuffer.set_text(pipeline_launcher.pipeline_desc)
+        # the pool template, so that a refresh redefines every instance
+        textbuffer.set_text(self.pool.template if self.pool is not None else pipeline_launcher.pipeline_desc)
         textbuffer.set_modified(False)
 
         container.add(label)
@@ -167,17 +181,21 @@ class GtkGstController(object):
 
         self.state_label = self._create_label("State", container=container_btns)
         self.position_label = self._create_label("Position", container=container_btns)
+        self.qos_label = self._create_label("QoS", container=container_btns)
         start_btn = self._create_button(label="Play", callback=self.run_pipeline, container=container_btns)
         stop_btn = self._create_button(label="Stop", callback=self.stop_pipeline, container=container_btns)
-        pause_btn = self._create_button(label="Pause", callback=pipeline_launcher.pause, container=container_btns)
-        eos_btn = self._create_button(label="Send EOS", callback=pipeline_launcher.send_eos, container=container_btns)
+        pause_btn = self._create_button(label="Pause", callback=self.pause_pipeline, container=container_btns)
+        eos_btn = self._create_button(label="Send EOS", callback=self.send_eos, container=container_btns)
         dot_btn = self._create_button(label="Show tree", callback=self._on_show_tree, container=container_btns)
         messages_btn = self._create_button(label="Show messages", callback=self._on_show_messages, container=container_btns)
 
         return container
 
     def run_pipeline(self, *args):
-        self.pipeline_launcher.run()
+        if self.pool is not None:
+            self.pool.play()
+        else:
+            self.pipeline_launcher.run()
         self._start_pollings()
         #TODO: update controls
 
@@ -193,19 +211,34 @@ class GtkGstController(object):
         GObject.timeout_add(500, self._check_for_pipeline_changes)
 
     def stop_pipeline(self, *args):
-        self.pipeline_launcher.stop(*args)
+        if self.pool is not None:
+            self.pool.stop()
+        else:
+            self.pipeline_launcher.stop(*args)
         self._stop_pollings()
         self._clean_previews()
 
+    def pause_pipeline(self, *args):
+        if self.pool is not None:
+            self.pool.pause()
+        else:
+            self.pipeline_launcher.pause()
+
+    def send_eos(self, *args):
+        if self.pool is not None:
+            self.pool.send_eos()
+        else:
+            self.pipeline_launcher.send_eos()
+
     def _build_elements(self):
-        introspector = PipelineIntrospector(self.pipeline_launcher.pipeline, self.ignore_list)
-        for element in introspector.elements:
+        if self.introspector is not None:
+            self.introspector.close()
+        self.introspector = PipelineIntrospector(self.pipeline_launcher.pipeline, self.ignore_list)
+        for element in self.introspector.iter_elements():
             self.add_element_widget(element)
-            if element.implements_childproxy:
-                for elem in element.children:
-                    self.add_element_widget(elem, element.name)
-                element.connect_child_added(self.add_element_widget)
-                element.connect_child_removed(self.remove_element_widget)
+        # only the changed elements are (un)built; dynamic bins change from streaming threads
+        self.introspector.connect_element_added(lambda element: GObject.idle_add(self._add_element_subtree, element))
+        self.introspector.connect_element_removed(lambda element: GObject.idle_add(self.remove_element_widget, element))
 
     def _start_pollings(self):
         if not self.poll_id:
@@ -219,6 +252,7 @@ class GtkGstController(object):
     def _do_checks(self):
         self._check_for_pipeline_position()
         self._check_for_pipeline_state()
+        self._check_for_pipeline_qos()
         self._poll_properties_watchlist()
         return True
 
@@ -227,11 +261,11 @@ class GtkGstController(object):
         test  = MessagesDisplayer(pipelinemanager_instance=self.pipeline_launcher)
 
     def _on_show_tree(self, *args):
-        dotfile = self.pipeline_launcher.dump_dot_file()
-        if dotfile:
-            from xdot import DotWindow
-            dotwindow = DotWindow()
-            dotwindow.open_file(dotfile)
+        from xdot import DotWindow
+        dotwindow = DotWindow()
+        # all details, states and property values included, as drawn by the viewer before graphs were cached;
+        # property values are not fingerprinted, so this graph is regenerated every time
+        dotwindow.set_dotcode(self.pipeline_launcher.get_dot_data(Gst.DebugGraphDetails.ALL).encode())
 
     def _clean_previews(self):
         for video in self.preview_container:
@@ -239,7 +273,10 @@ class GtkGstController(object):
             del(video)
 
     def _check_for_pipeline_state(self):
-        state = self.pipeline_launcher.get_state()
+        if self.pool is not None:
+            state = self.pool.get_summary_string()
+        else:
+            state = self.pipeline_launcher.get_state()
         self.state_label.set_text(state)
 
     def _check_for_pipeline_position(self):
@@ -247,6 +284,12 @@ class GtkGstController(object):
         position = str(self.pipeline_launcher.get_position())
         self.position_label.set_text("Position: {0} s / {1} s".format(position, duration))
 
+    def _check_for_pipeline_qos(self):
+        qos = self.pipeline_launcher.qos
+        self.qos_label.set_text(qos.format_summary())
+        self.qos_label.set_tooltip_text("\n".join("{0}: {1} dropped / {2} processed, jitter {3:.1f} ms, proportion {4:.2f}".format(
+            row["source"], row["dropped"], row["processed"], row["jitter_mean_ms"], row["proportion"]) for row in qos.report()))
+
     def _check_for_pipeline_changes(self):
         if self.textbuffer.get_modified():
             self.new_description = self.textbuffer.get_text(*self.textbuffer.get_bounds(), include_hidden_chars=False)
@@ -262,17 +305,50 @@ class GtkGstController(object):
         adj.set_value(prop.value)
 
     def _refresh(self, *args):
+        if self.pool is not None:
+            logger.info("Refreshing all pipeline instances with description: {0}".format(self.new_description))
+            self._clean_controls()
+            self.stop_pipeline()
+            self.pool.redefine(self.new_description)
+            self.textbuffer.set_modified(False)
+            self.refresh_button.set_sensitive(False)
+            self._build_elements()
+            self._start_pollings()
+            return
+        if self.standby_refresh:
+            logger.info("Refreshing pipeline in the background with description: {0}" .format(self.new_description))
+            if not self.pipeline_launcher.swap_pipeline(self.new_description, self._on_standby_prepare, self._on_standby_switched):
+                self.textbuffer.set_modified(False)
+                self.refresh_button.set_sensitive(False)
+            return
         self._clean_controls()
         self.stop_pipeline()
         logger.info("Refreshing pipeline with description: {0}" .format(self.new_description))
         self.pipeline_launcher.redefine_pipeline(new_string=self.new_description)
-        self.pipeline_launcher.bus.connect('message::element', self.on_sync_message)
         self.pipeline_launcher.run()
         self.textbuffer.set_modified(False)
         self._build_elements()
 
+    def _on_standby_prepare(self, pipeline):
+        # previews of the running pipeline are removed once the new one is playing
+        self._old_previews = self.preview_container.get_children()
+
+    def _on_standby_switched(self, pipeline_launcher):
+        self._stop_pollings()
+        for video in self._old_previews:
+            self.preview_container.remove(video)
+        self._old_previews = []
+        self._clean_controls()
+        self.prop_list = list()
+        self.prop_watchlist = list()
+        self.textbuffer.set_modified(False)
+        self.refresh_button.set_sensitive(False)
+        self._build_elements()
+        self._start_pollings()
+
     def _clean_controls(self):
         logger.debug("Removing all controls")
+        self.element_widgets = {}
         for item in self.properties_container:
             self.properties_container.remove(item)
 
@@ -296,29 +372,35 @@ class GtkGstController(object):
         container = Gtk.VBox()
         mcontainer.add(container)
         logger.debug("Element name: {0}".format(element.name))
-        if len(element.number_properties) > 0:
-            for number_property in element.number_properties:
-                spinner = self._create_spinner(number_property)
-                container.pack_start(spinner, False, False, 6)
-        if len(element.boolean_properties) > 0:
-            for boolean_property in element.boolean_properties:
-                check_btn = self._create_check_btn(boolean_property)
-                container.pack_start(check_btn, False, False, 6)
-        if len(element.string_properties) > 0:
-            for string_property in element.string_properties:
-                if string_property.name == "location":
-                    entry = self._create_filebrowser(string_property)
-                else:
-                    entry = self._create_entry(string_property)
-                container.pack_start(entry, False, False, 6)
-        if len(element.enum_properties) > 0:
-            for enum_property in element.enum_properties:
-                enum = self._create_enum_combobox(enum_property)
-                container.pack_start(enum, False, False, 6)
+        # property values are read and their widgets created when the section is first expanded
+        mcontainer.connect("notify::expanded", self._on_element_expanded, element)
         container.show()
         mcontainer.show()
         return mcontainer
 
+    def _on_element_expanded(self, mcontainer, pspec, element):
+        if not mcontainer.get_expanded() or getattr(mcontainer, 'properties_built', False):
+            return
+        mcontainer.properties_built = True
+        element.refresh_values()
+        container = mcontainer.get_child()
+        widgets = []
+        for number_property in element.number_properties:
+            widgets.append(self._create_spinner(number_property))
+        for boolean_property in element.boolean_properties:
+            widgets.append(self._create_check_btn(boolean_property))
+        for string_property in element.string_properties:
+            if string_property.name == "location":
+                widgets.append(self._create_filebrowser(string_property))
+            else:
+                widgets.append(self._create_entry(string_property))
+        for enum_property in element.enum_properties:
+            widgets.append(self._create_enum_combobox(enum_property))
+        # child elements sections may already have been added
+        for position, widget in enumerate(widgets):
+            container.pack_start(widget, False, False, 6)
+            container.reorder_child(widget, position)
+
 
     # FIXME: notify:: should to this !
     def _poll_properties_watchlist(self):
@@ -451,12 +533,16 @@ class GtkGstController(object):
             filename = chooser.get_filename()
             widget.set_label(filename)
             logger.info('{0} selected'.format(filename))
-            if prop.parent_element.name == 'filesrc':
+            if prop.parent_element.name == 'filesrc' and self.pool is not None:
+                # stopped instances accept a new location without being parsed again
+                self.stop_pipeline()
+                self.pool.set_property(prop.parent_element._Gst_element.get_name(), prop.name, filename)
+                self.run_pipeline()
+            elif prop.parent_element.name == 'filesrc':
                 logger.info('Warning, changing filename on running/dynamic pipelines is not supported, reparsing pipeline')
                 self.stop_pipeline()
                 self.pipeline_launcher.redefine_pipeline()
                 self._clean_controls()
-                self.pipeline_launcher.bus.connect('message::element', self.on_sync_message)
                 self._build_elements()
                 prop.parent_element._Gst_element.set_property(prop.name, filename)
                 self.pipeline_launcher.run()
@@ -479,22 +565,26 @@ class GtkGstController(object):
     def add_element_widget(self, element, parent_name=None):
         logger.debug("Adding widgets for element {0}".format(element.name))
         widget = self._create_element_widget(element)
-        self.add_controller(widget, parent_name)
+        self.element_widgets[element] = widget
+        parent_widget = self.element_widgets.get(element.parent)
+        if parent_widget is not None:
+            parent_widget.get_child().add(widget)
+        else:
+            self.add_controller(widget, parent_name)
+
+    def _add_element_subtree(self, element):
+        for descendant in element.iter_elements():
+            self.add_element_widget(descendant)
         
     def remove_element_widget(self, element, parent_name=None):
         logger.debug("Removing widgets for element {0}".format(element.name))
-        children = self.properties_container.get_children()
-        if parent_name:
-            for child in children:
-                if child.get_label() == parent_name:
-                    pchild = child.get_child()
-                    for cchild in pchild.get_children():
-                        if hasattr(cchild, 'get_label'):
-                            if cchild.get_label() == element.name:
-                                pchild.remove(cchild)
-        for child in children:
-            if child.get_name() == element.name:
-                children.remove(child)
+        removed = list(element.iter_elements())
+        widget = self.element_widgets.get(element)
+        for descendant in removed:
+            self.element_widgets.pop(descendant, None)
+        self.prop_list = [(prop, prop_widget) for prop, prop_widget in self.prop_list if prop.parent_element not in removed]
+        if widget is not None and widget.get_parent() is not None:
+            widget.get_parent().remove(widget)
 
 
 
@@ -539,7 +629,11 @@ class GtkGstController(object):
         # FIXME: check MUTABLE property 
         if prop.name == "bitrate" and prop.parent_element.name == "theoraenc":
             self.stop()
-        prop.parent_element.set_property(prop.name, value)
+        if self.pool is not None:
+            # with --target all, the element of the same name is changed in every instance
+            self.pool.set_property(prop.parent_element._Gst_element.get_name(), prop.name, value)
+        else:
+            prop.parent_element.set_property(prop.name, value)
         if prop.name == "bitrate" and prop.parent_element.name == "theoraenc":
             self.pipeline_launcher.run()
         
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# * This Program is free software; you can redistribute it and/or
+# * modify it under the terms of the GNU Lesser General Public
+# * License as published by the Free Software Foundation; either
+# * version 2.1 of the License, or (at your option) any later version.
+# *
+# * Libav is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# * Lesser General Public License for more details.
+# *
+# * You should have received a copy of the GNU Lesser General Public
+# * License along with Libav; if not, write to the Free Software
+# * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Gst-gengui: headless controller
+
+Controls a pipeline from the command line or from commands read on stdin,
+with a plain GLib main loop: neither GTK nor the X11 bindings are loaded.
+
+Commands: play, pause, stop, eos, state, position, list, profile, queues, caps, qos,
+set <element>.<property> <value>, get <element>.<property>,
+poll <element>.<property> [interval_ms], unpoll,
+seek <seconds> [mode] [rate], quit
+
+With a pool of instances (--target all), every command acts on all of them;
+properties are set on the element of the same name in each instance.
+
+Copyright 2013, Dirk Van Haerenborgh, under the terms of LGPL
+
+"""
+__author__ = ("Florent Thiery <fthiery@gmail.com>", "Dirk Van Haerenborgh <vhdirk@gmail.com>")
+
+import sys
+import functools
+import logging
+logger = logging.getLogger('headless')
+
+from gi.repository import GLib
+
+from .gstmanager import PipelineManager, easyevent
+from .gstintrospector import PipelineIntrospector
+
+
+class HeadlessController(easyevent.User):
+    def __init__(self, pipeline_launcher, pool=None, ignore_list=[], quit_on_eos=True):
+        easyevent.User.__init__(self)
+        self.pipeline_launcher = pipeline_launcher
+        # when set, commands act on every instance of the pool
+        self.pool = pool
+        self.ignore_list = ignore_list
+        self.quit_on_eos = quit_on_eos
+        self.exit_code = 0
+        self.loop = GLib.MainLoop()
+        self.register_event('eos', 'gst_error', 'queue_full', 'queue_empty', 'queue_normal')
+
+    def evt_eos(self, event):
+        if event.source is not self.pipeline_launcher and self.pool is None:
+            return
+        print("EOS: {0}".format(event.content))
+        if self.quit_on_eos and (self.pool is None or len(self.pool.eos) == len(self.pool.managers)):
+            self.quit()
+
+    def evt_gst_error(self, event):
+        print("Error: {0}".format(event.content))
+        self.exit_code = 1
+        if self.quit_on_eos:
+            self.quit()
+
+    def evt_queue_full(self, event):
+        print("Queue {0} full: {1}".format(event.content["source"], event.content["levels"]))
+
+    def evt_queue_empty(self, event):
+        print("Queue {0} empty".format(event.content["source"]))
+
+    def evt_queue_normal(self, event):
+        print("Queue {0} back to {1:.0%}".format(event.content["source"], event.content["fill"]))
+
+    def _print_header(self, manager):
+        if self.pool is not None:
+            print("{0}:".format(manager.name))
+
+    def print_queues(self):
+        for manager in self._targets():
+            self._print_header(manager)
+            if manager.queue_monitor is None:
+                print("Queue monitoring is not enabled")
+                continue
+            for name, queue in sorted(manager.queue_monitor.snapshot().items()):
+                print("{0:<24} {1:>5} {2:<6} {3}".format(name, "{0:.0%}".format(queue["fill"]) if queue["fill"] is not None else "-", queue["state"], queue["levels"]))
+
+    def print_caps(self):
+        for manager in self._targets():
+            self._print_header(manager)
+            if manager.caps_tracker is None:
+                print("Caps tracking is not enabled")
+                continue
+            for row in manager.caps_tracker.report():
+                print("{0:<40} {1:>3}{2} {3}".format(row["pad"], row["renegotiations"], "!" if row["flagged"] else " ", row["caps"]))
+
+    def print_qos(self):
+        for manager in self._targets():
+            self._print_header(manager)
+            for row in manager.get_qos_stats():
+                print("{0:<40} {1:>8} dropped {2:>8} processed  jitter {3:>7.1f} ms  proportion {4:.2f}  lateness {5}".format(
+                    row["source"], row["dropped"], row["processed"], row["jitter_mean_ms"], row["proportion"], row["lateness_ms"]))
+
+    def print_positions(self):
+        for manager in self._targets():
+            prefix = "{0}: ".format(manager.name) if self.pool is not None else ""
+            print("{0}{1} / {2}".format(prefix, manager.get_position(), manager.get_duration()))
+
+    def _targets(self):
+        if self.pool is not None:
+            return [manager for manager in self.pool.select('all') if hasattr(manager, 'pipeline')]
+        return [self.pipeline_launcher]
+
+    def play(self, *args):
+        if self.pool is not None:
+            self.pool.play()
+        else:
+            self.pipeline_launcher.run()
+        return False
+
+    def pause(self, *args):
+        for manager in self._targets():
+            manager.pause()
+
+    def stop(self, *args):
+        for manager in self._targets():
+            manager.stop()
+
+    def send_eos(self, *args):
+        for manager in self._targets():
+            manager.send_eos()
+        return False
+
+    def set_property(self, target, value):
+        element_name, property_name = target.split('.', 1)
+        if self.pool is not None:
+            if not self.pool.set_property(element_name, property_name, value):
+                print("No instance has an element {0}".format(element_name))
+        else:
+            self.pipeline_launcher.set_property_on_element(element_name, property_name, value)
+
+    def get_property(self, target):
+        """
+        Returns the property value, or the values per instance name with a pool
+        """
+        element_name, property_name = target.split('.', 1)
+        if self.pool is not None:
+            return dict((manager.name, manager.get_property_on_element(element_name, property_name))
+                        for manager in self._targets() if manager.get_element(element_name) is not None)
+        return self.pipeline_launcher.get_property_on_element(element_name, property_name)
+
+    def poll(self, target, interval_ms=1000):
+        element_name, property_name = target.split('.', 1)
+        return [manager.poller.add(element_name, property_name, int(interval_ms), functools.partial(self._print_polled_value, manager))
+                for manager in self._targets()]
+
+    def unpoll(self):
+        for manager in self._targets():
+            manager.deactivate_pollings()
+
+    def seek(self, position, mode='default', rate=1.0):
+        if self.pool is not None:
+            self.pool.seek(position, mode, rate)
+        else:
+            self.pipeline_launcher.seek(position, mode, rate)
+
+    def _print_polled_value(self, manager, watch, value):
+        prefix = "{0}: ".format(manager.name) if self.pool is not None else ""
+        print("{0}{1}.{2} = {3}".format(prefix, watch.element_name, watch.property, value))
+
+    def list_properties(self):
+        introspector = PipelineIntrospector(self.pipeline_launcher.pipeline, self.ignore_list)
+        for element in introspector.elements:
+            print("{0} ({1})".format(element._Gst_element.get_name(), element.name))
+            element.refresh_values()
+            for prop in element.number_properties + element.boolean_properties + element.string_properties + element.enum_properties:
+                print("    {0} = {1}{2}".format(prop.name, prop.value, " (readonly)" if prop.is_readonly else ""))
+        introspector.close()
+
+    def print_profile(self):
+        for manager in self._targets():
+            self._print_header(manager)
+            if manager.profiler is not None:
+                print(manager.profiler.format_report())
+            else:
+                print("Profiling is not enabled")
+
+    def run_command(self, line):
+        words = line.split()
+        if not words:
+            return
+        command, args = words[0], words[1:]
+        try:
+            if command == 'play':
+                self.play()
+            elif command == 'pause':
+                self.pause()
+            elif command == 'stop':
+                self.stop()
+            elif command == 'eos':
+                self.send_eos()
+            elif command == 'state':
+                print(self.pool.get_summary_string() if self.pool is not None else self.pipeline_launcher.get_state())
+            elif command == 'position':
+                self.print_positions()
+            elif command == 'list':
+                self.list_properties()
+            elif command == 'profile':
+                self.print_profile()
+            elif command == 'queues':
+                self.print_queues()
+            elif command == 'caps':
+                self.print_caps()
+            elif command == 'qos':
+                self.print_qos()
+            elif command == 'set':
+                self.set_property(args[0], " ".join(args[1:]))
+            elif command == 'get':
+                print(self.get_property(args[0]))
+            elif command == 'poll':
+                self.poll(*args)
+            elif command == 'seek':
+                mode = args[1] if len(args) > 1 else 'default'
+                rate = float(args[2]) if len(args) > 2 else 1.0
+                self.seek(float(args[0]), mode, rate)
+            elif command == 'unpoll':
+                self.unpoll()
+            elif command == 'quit':
+                self.quit()
+            else:
+                print("Unknown command {0}".format(command))
+        except (IndexError, KeyError, ValueError, AttributeError, TypeError) as e:
+            print("Invalid command {0!r}: {1}".format(line, e))
+
+    def _on_stdin(self, channel, condition):
+        line = sys.stdin.readline()
+        if not line:
+            return False
+        self.run_command(line)
+        return True
+
+    def read_commands(self):
+        GLib.io_add_watch(sys.stdin, GLib.IO_IN | GLib.IO_HUP, self._on_stdin)
+
+    def quit(self):
+        for manager in self._targets():
+            profiler = manager.stop_profiling()
+            if profiler is not None:
+                self._print_header(manager)
+                print(profiler.format_report())
+        self.stop()
+        if self.loop.is_running():
+            self.loop.quit()
+
+    def main(self):
+        GLib.idle_add(self.play)
+        try:
+            self.loop.run()
+        except KeyboardInterrupt:
+            self.quit()
+        self.close()
+        return self.exit_code
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+        else:
+            self.pipeline_launcher.close()
+
+
+def main():
+    from .gstgengui import init, parse_args
+
+    import argparse
+    parser = argparse.ArgumentParser(prog="gstgengui-headless", description='controlling GStreamer pipelines and elements without GUI', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-v', "--verbose", action="store_true", dest="verbose", default=False, help="Use DEBUG verbosity level")
+    parser.add_argument("--set", dest="set", action="append", default=[], metavar="ELEMENT.PROPERTY=VALUE", help="Set a property before playing")
+    parser.add_argument("--poll", dest="poll", action="append", default=[], metavar="ELEMENT.PROPERTY[@MS]", help="Print a property value when it changes")
+    parser.add_argument("--duration", dest="duration", type=float, help="Send EOS after the given number of seconds")
+    parser.add_argument("--profile", action="store_true", dest="profile", default=False, help="Measure per element buffer rates and processing times, printed on exit")
+    parser.add_argument("--profile-sampling", dest="profile_sampling", type=int, default=16, help="Time one buffer out of N when profiling")
+    parser.add_argument("--profile-window", dest="profile_window", metavar="MS/PERIOD_MS", help="Only probe for MS milliseconds out of every PERIOD_MS when profiling")
+    parser.add_argument("--monitor-queues", action="store_true", dest="monitor_queues", default=False, help="Report queues staying full or empty")
+    parser.add_argument("--track-caps", action="store_true", dest="track_caps", default=False, help="Record caps negotiated on every link and report frequent renegotiations")
+    parser.add_argument("--list", action="store_true", dest="list", default=False, help="Print all element properties and quit")
+    parser.add_argument('-n', "--instances", dest="instances", type=int, default=1, help="Number of pipeline instances to run; $index and $name are substituted in the description")
+    parser.add_argument("--substitute", dest="substitutions", action="append", default=[], metavar="KEY=V1,V2", help="Substitute $KEY in the description of instance i with value i modulo the number of values")
+    parser.add_argument('-t', "--target", dest="target", default="0", help="Instance controlled by the commands: an index, a name, or 'all'")
+    parser.add_argument('-i', "--interactive", action="store_true", dest="interactive", default=False, help="Read commands from stdin")
+    parser.add_argument('pipeline', nargs='+', help='Pipeline description')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s',
+        stream=sys.stderr
+    )
+
+    init()
+    pool = None
+    if args.instances > 1:
+        from .gstpool import PipelinePool
+        substitutions = dict((key, values.split(',')) for key, values in (arg.split('=', 1) for arg in args.substitutions))
+        pool = PipelinePool(parse_args(args.pipeline), args.instances, substitutions)
+        pool.enable_throughput()
+        targets = pool.select(args.target)
+        if not targets:
+            logger.error("No pipeline instance matches {0}, quitting".format(args.target))
+            sys.exit(1)
+        pipeline_launcher = targets[0]
+        if args.target != 'all':
+            # the other instances run alongside the controlled one
+            for manager in pool.managers:
+                if manager is not pipeline_launcher:
+                    GLib.idle_add(manager.run)
+            pool = None
+    else:
+        pipeline_launcher = PipelineManager(parse_args(args.pipeline))
+    if not hasattr(pipeline_launcher, 'pipeline'):
+        sys.exit(1)
+    controller = HeadlessController(pipeline_launcher, pool)
+
+    if args.list:
+        controller.list_properties()
+        controller.close()
+        return
+    for assignment in args.set:
+        target, value = assignment.split('=', 1)
+        controller.set_property(target, value)
+    for poll in args.poll:
+        controller.poll(*poll.split('@', 1))
+    if args.duration is not None:
+        GLib.timeout_add(int(args.duration * 1000), controller.send_eos)
+    window = [int(value) for value in args.profile_window.split('/', 1)] if args.profile_window else []
+    if window and len(window) != 2:
+        parser.error("--profile-window takes MS/PERIOD_MS")
+    for manager in controller._targets():
+        if args.track_caps:
+            manager.start_caps_tracking()
+        if args.monitor_queues:
+            manager.start_queue_monitor()
+        if args.profile:
+            manager.start_profiling(args.profile_sampling, *window)
+    if args.interactive:
+        controller.read_commands()
+    sys.exit(controller.main())
+
+if __name__ == '__main__':
+    main()
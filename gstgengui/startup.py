@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# * This Program is free software; you can redistribute it and/or
+# * modify it under the terms of the GNU Lesser General Public
+# * License as published by the Free Software Foundation; either
+# * version 2.1 of the License, or (at your option) any later version.
+# *
+# * Libav is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# * Lesser General Public License for more details.
+# *
+# * You should have received a copy of the GNU Lesser General Public
+# * License along with Libav; if not, write to the Free Software
+# * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Gst-gengui: startup environment and timings
+
+Only depends on the standard library, as it is imported with the package:
+the typelib search path has to be set before gi loads any typelib.
+
+Copyright 2013, Dirk Van Haerenborgh, under the terms of LGPL
+
+"""
+__author__ = ("Florent Thiery <fthiery@gmail.com>", "Dirk Van Haerenborgh <vhdirk@gmail.com>")
+
+import os
+import sys
+import time
+
+TYPELIB_DIRS = ("/usr/local/lib/girepository-1.0", "/usr/lib/girepository-1.0")
+
+# (label, time, number of loaded modules), the first one taken when the package is imported
+marks = [("package import", time.perf_counter(), len(sys.modules))]
+
+
+def extend_typelib_path():
+    """
+    Appends TYPELIB_DIRS to GI_TYPELIB_PATH, keeping the directories already set first
+    """
+    paths = [path for path in os.environ.get('GI_TYPELIB_PATH', '').split(os.pathsep) if path]
+    for path in TYPELIB_DIRS:
+        if path not in paths:
+            paths.append(path)
+    os.environ['GI_TYPELIB_PATH'] = os.pathsep.join(paths)
+
+
+def mark(label):
+    """
+    Records the end of the startup step called label
+    """
+    marks.append((label, time.perf_counter(), len(sys.modules)))
+
+
+def format_report():
+    lines = ["{0:<28} {1:>9} {2:>9} {3:>8}".format("Startup step", "step ms", "total ms", "modules")]
+    start, previous, previous_modules = marks[0][1], marks[0][1], marks[0][2]
+    for label, timestamp, modules in marks[1:]:
+        lines.append("{0:<28} {1:>9.1f} {2:>9.1f} {3:>8}".format(label, (timestamp - previous) * 1000, (timestamp - start) * 1000, "+{0}".format(modules - previous_modules)))
+        previous, previous_modules = timestamp, modules
+    return "\n".join(lines)
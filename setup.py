@@ -16,7 +16,9 @@ setup(
     packages = find_packages(),
 
     
-    entry_points=dict(gui_scripts=['gstgengui=gstgengui.gstgengui:main']),
+    entry_points=dict(gui_scripts=['gstgengui=gstgengui.gstgengui:main'],
+                      console_scripts=['gstgengui-headless=gstgengui.headless:main',
+                                       'gstgengui-benchmark=gstgengui.benchmark:main']),
     
     dependency_links = [
         "http://github.com/vhdirk/xdot.py/tarball/master"